@@ -0,0 +1,180 @@
+import collections
+import logging
+import os
+import statistics
+import threading
+import time
+
+
+# Full pipelines running at once on this instance (each holds several Claude streams)
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+# Runs waiting for a slot; beyond this new requests are shed
+RUN_QUEUE_SIZE = int(os.getenv("RUN_QUEUE_SIZE", "8"))
+# Runs one API key may have running at once; its further requests wait in the queue
+# (the operator's ANTHROPIC_API_KEY, shared by every visitor, isn't capped)
+KEY_MAX_RUNS = int(os.getenv("KEY_MAX_RUNS", "1"))
+# When the estimated wait is longer than this, serve a template game right away instead
+# of queueing (0 = always queue)
+DEGRADE_AFTER_SECONDS = float(os.getenv("DEGRADE_AFTER_SECONDS", "60"))
+# Assumed run length until real runs have been timed
+DEFAULT_RUN_SECONDS = 45.0
+
+logger = logging.getLogger(__name__)
+
+FULL = "full"
+QUEUED = "queued"
+DEGRADED = "degraded"
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; the message is meant for the user"""
+
+
+def format_wait(seconds):
+    """'about 40s' / 'about 3 min'"""
+    if seconds < 90:
+        return f"about {max(5, int(round(seconds / 5.0)) * 5)}s"
+    return f"about {int(round(seconds / 60.0))} min"
+
+
+class Ticket:
+    """One generate request's place in admission: FULL (holds a slot), QUEUED or DEGRADED"""
+
+    def __init__(self, key_id, mode):
+        self.key_id = key_id
+        self.mode = mode
+        self.created = time.time()
+        self.admitted = None
+        self.released = False
+        # Estimated wait when the request came in (why it was degraded)
+        self.wait = 0.0
+
+
+class AdmissionController:
+    """
+    Per-instance admission for the generate endpoint.
+
+    At most max_runs full pipelines run at once and each API key runs at most
+    per_key of them (key_id None is never capped). Requests beyond that wait in a
+    bounded FIFO queue with a wait estimate (from recent finished runs); a queued
+    request whose key is at its cap lets the ones behind it go first. When the
+    estimate is past degrade_after the request gets the template game instead
+    (no Claude calls), and when the queue is full it is shed with Overloaded.
+    """
+
+    def __init__(self, max_runs=MAX_CONCURRENT_RUNS, queue_size=RUN_QUEUE_SIZE, per_key=KEY_MAX_RUNS,
+                 degrade_after=DEGRADE_AFTER_SECONDS):
+        self.max_runs = max_runs
+        self.queue_size = queue_size
+        self.per_key = per_key
+        self.degrade_after = degrade_after
+        self.running = 0
+        self.waiting = collections.deque()
+        self.per_key_runs = collections.Counter()
+        self.durations = collections.deque(maxlen=50)
+        self.counts = collections.Counter()
+        self._cond = threading.Condition()
+
+    def typical_run(self):
+        """Median duration of recent full runs, in seconds"""
+        return statistics.median(self.durations) if self.durations else DEFAULT_RUN_SECONDS
+
+    def estimate_wait(self, position):
+        """Seconds until the request at this (0-based) queue position gets a slot"""
+        return (position // self.max_runs + 1) * self.typical_run()
+
+    def under_pressure(self):
+        """True when every slot is busy - optional work (speculative analysis) should wait"""
+        with self._cond:
+            return self.running >= self.max_runs
+
+    def request(self, key_id):
+        """Ticket for a new generate request, or Overloaded if it must be shed"""
+        with self._cond:
+            ticket = Ticket(key_id, QUEUED)
+            self.waiting.append(ticket)
+            self._admit_waiting()
+            if ticket.mode == QUEUED:
+                position = len(self.waiting) - 1
+                wait = self.estimate_wait(position)
+                if self.degrade_after and wait > self.degrade_after:
+                    self.waiting.remove(ticket)
+                    ticket.mode = DEGRADED
+                    ticket.wait = wait
+                elif position >= self.queue_size:
+                    self.waiting.remove(ticket)
+                    self.counts['shed_full'] += 1
+                    raise Overloaded(
+                        f"Too many games are being generated right now ({self.running} running, "
+                        f"{len(self.waiting)} waiting). Please try again in {format_wait(wait)}."
+                    )
+            self.counts[ticket.mode] += 1
+            logger.info("Admission: %s (running %d/%d, waiting %d/%d)", ticket.mode, self.running,
+                        self.max_runs, len(self.waiting), self.queue_size,
+                        extra={"admission": ticket.mode, "running": self.running, "waiting": len(self.waiting)})
+            return ticket
+
+    def position(self, ticket):
+        """0-based place of a queued ticket, None once it has a slot"""
+        with self._cond:
+            try:
+                return self.waiting.index(ticket)
+            except ValueError:
+                return None
+
+    def wait(self, ticket, timeout):
+        """Block up to timeout seconds for a queued ticket's slot, True once it has one"""
+        with self._cond:
+            self._cond.wait_for(lambda: ticket.mode == FULL, timeout)
+            return ticket.mode == FULL
+
+    def release(self, ticket, finished=False):
+        """
+        The request finished, failed or was abandoned: free its slot or queue place.
+        Only finished runs count toward the typical run time (a stopped or failed run
+        is short and would make the wait estimates too optimistic).
+        """
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.mode == QUEUED:
+                self.waiting.remove(ticket)
+            elif ticket.mode == FULL:
+                self.running -= 1
+                self.per_key_runs[ticket.key_id] -= 1
+                if self.per_key_runs[ticket.key_id] <= 0:
+                    del self.per_key_runs[ticket.key_id]
+                if finished:
+                    self.durations.append(time.time() - ticket.admitted)
+            self._admit_waiting()
+
+    def _key_capped(self, key_id):
+        return key_id is not None and self.per_key and self.per_key_runs[key_id] >= self.per_key
+
+    def _admit_waiting(self):
+        """Give free slots to waiting tickets in order, skipping keys at their cap"""
+        admitted = False
+        for ticket in list(self.waiting):
+            if self.running >= self.max_runs:
+                break
+            if not self._key_capped(ticket.key_id):
+                self.waiting.remove(ticket)
+                self._admit(ticket)
+                admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def _admit(self, ticket):
+        ticket.mode = FULL
+        ticket.admitted = time.time()
+        self.running += 1
+        self.per_key_runs[ticket.key_id] += 1
+
+    def stats(self):
+        with self._cond:
+            return {"running": self.running, "waiting": len(self.waiting), "typical_run": self.typical_run(),
+                    **self.counts}
+
+
+admission = AdmissionController()
@@ -1,49 +1,212 @@
 import gradio as gr
+import json
+import logging
 import os
+import threading
 from dotenv import load_dotenv
-from game_generator import ImageToGameGenerator
+from run_context import RunContext, RunRegistry
+from game_runtime import PERF_MESSAGE_TYPE
+from log_setup import setup_logging
+from budget import key_fingerprint
+from admission import admission, Overloaded, QUEUED, DEGRADED, format_wait
+import progress
+
+# The generator (anthropic SDK, image pipeline), the artifact store and speculation
+# are imported on first use, so a cold start only pays for Gradio before serving the page.
+# preload() then loads them and starts the CPU pool in the background. (In
+# CPU_POOL_MODE=process, workers re-import this script and rebuild the UI, see cpu_pool.)
 
 # Load environment variables (for local development)
 load_dotenv()
 
+# JSON lines written from a background thread; LOG_LEVEL=DEBUG shows every verification check
+setup_logging()
+logger = logging.getLogger("app")
+
 # Global generator (will be set when API key provided)
 generator = None
 
-def generate_game(image, api_key):
+_lazy = {}
+_lazy_lock = threading.Lock()
+
+def _load_once(name, build):
+    """build() the first time name is asked for, then reuse it"""
+    if name not in _lazy:
+        with _lazy_lock:
+            if name not in _lazy:
+                _lazy[name] = build()
+    return _lazy[name]
+
+def new_generator(api_key):
+    from game_generator import ImageToGameGenerator
+    return ImageToGameGenerator(api_key)
+
+def get_artifact_store():
+    """Saved games served by the permalink route (None if ARTIFACT_DIR is empty)"""
+    def build():
+        from artifact_store import ArtifactStore, ARTIFACT_DIR
+        return ArtifactStore(ARTIFACT_DIR) if ARTIFACT_DIR else None
+    return _load_once("artifact_store", build)
+
+def get_speculator():
+    """Analysis started on upload, picked up by Generate (None if SPECULATIVE_ANALYSIS=0)"""
+    def build():
+        from speculation import SpeculativeAnalyzer, SPECULATIVE_ANALYSIS
+        return SpeculativeAnalyzer(new_generator) if SPECULATIVE_ANALYSIS else None
+    return _load_once("speculator", build)
+
+def preload():
+    """
+    Import the generation stack and start the CPU pool in the background once the
+    page is being served, so the first upload pays for neither
+    """
+    try:
+        import game_generator  # noqa: F401
+        import anthropic  # noqa: F401
+        import cpu_pool
+        cpu_pool.warm()
+        get_artifact_store()
+        get_speculator()
+    except Exception:
+        logger.exception("Preloading the generator failed")
+
+def speculate(image, api_key, previous_key):
+    """Start analysing a new upload in the background, cancel work for the replaced image"""
+    
+    speculator = get_speculator()
+    key = None
+    # With every slot busy, optional work would only slow down the runs already admitted
+    if speculator is not None and image is not None and api_key and api_key.strip() and not admission.under_pressure():
+        key = speculator.start(image, api_key.strip())
+    
+    if speculator is not None and previous_key and previous_key != key:
+        speculator.cancel(previous_key)
+    return key
+
+# Runs in progress per browser session, so Stop / closing the tab can cancel them
+active_runs = RunRegistry()
+
+def stop_generation(request: gr.Request):
+    """Stop button: cancel this session's run and abort its in-flight Claude call"""
+    active_runs.cancel_session(request.session_hash, "stopped by user")
+
+def cancel_on_disconnect(request: gr.Request):
+    """Tab closed or reloaded: nobody will see the result, stop paying for it"""
+    active_runs.cancel_session(request.session_hash, "client disconnected")
+
+def render_event(event, log):
+    """
+    Gradio updates (game, analysis, reflection) for one progress event.
+    Outputs the event doesn't touch are skipped, so only changed components are sent.
+    log is this run's list of reflection lines, extended in place.
+    """
+    kind = event['type']
+    if kind == progress.QUEUED:
+        place = f"#{event['position'] + 1} in line" if event['position'] else "next in line"
+        return (progress.placeholder_html(f"⏳ Waiting for a free slot: {place}, {format_wait(event['wait'])}", "#ffaa00"),
+                gr.skip(), gr.skip())
+    
+    if kind == progress.ANALYSIS:
+        return gr.skip(), event['analysis'], gr.skip()
+    
+    if kind == progress.STATUS:
+        log.append(event['message'])
+        game = event['placeholder'] if event['placeholder'] is not None else gr.skip()
+        return game, gr.skip(), "\n".join(log)
+    
+    if kind == progress.SPEC:
+        spec, issues = event['spec'], event['issues']
+        log.append(f"Step 2 complete!\n\nGame Spec:\n{json.dumps(spec, indent=2)}\n\n"
+                   f"Position Check: {'Verified' if not issues else f'{len(issues)} issues remaining'}\n")
+        placeholder = progress.placeholder_html(f'Building {spec.get("title", "game")}...')
+        return placeholder, gr.skip(), "\n".join(log)
+    
+    if kind == progress.RESULT:
+        log.append(event['summary'])
+        return event['game_html'], gr.skip(), "\n".join(log)
+    
+    # progress.ERROR
+    log.append(event['message'])
+    return event['game_html'], gr.skip(), "\n".join(log)
+
+# How often a queued request refreshes its place in line
+QUEUE_POLL_SECONDS = 1.0
+# Requests Gradio itself holds before handing them to generate_game (beyond that it rejects them)
+GRADIO_QUEUE_SIZE = int(os.getenv("GRADIO_QUEUE_SIZE", "64"))
+
+def busy_html(message):
+    return f"""
+    <div style='padding: 20px; background: #1a1a1a; color: #ffaa00; border-radius: 10px;'>
+        <h3>⏳ Server Busy</h3>
+        <p>{message}</p>
+    </div>
+    """
+
+def generate_game(image, api_key, request: gr.Request):
     """Main function that generates the game from an image."""
     
     global generator
     
     # Validate inputs
     if image is None:
-        yield {
-            'analysis': 'Please upload an image first!',
-            'reflection': '',
-            'game_html': '<p style="color: red;">No image uploaded</p>'
-        }
+        yield render_event(progress.error_event('Please upload an image first!',
+                                                '<p style="color: red;">No image uploaded</p>'), [])
         return
     
     if not api_key or api_key.strip() == "":
-        yield {
-            'analysis': 'Please enter your Anthropic API key!',
-            'reflection': '',
-            'game_html': '<p style="color: red;">No API key provided</p>'
-        }
+        yield render_event(progress.error_event('Please enter your Anthropic API key!',
+                                                '<p style="color: red;">No API key provided</p>'), [])
+        return
+    
+    # Admission: a slot now, a place in the bounded queue, a template game, or shed.
+    # The operator's key is shared by every visitor, so it gets no per-key cap.
+    shared_key = api_key.strip() == os.getenv("ANTHROPIC_API_KEY", "").strip()
+    try:
+        ticket = admission.request(None if shared_key else key_fingerprint(api_key.strip()))
+    except Overloaded as e:
+        yield render_event(progress.error_event(f"Server busy: {e}", busy_html(str(e))), [])
         return
     
+    session = request.session_hash if request is not None else None
+    context = None
+    finished = False
     try:
+        # Stop / closing the tab closes this generator while it waits, which frees the place
+        while ticket.mode == QUEUED:
+            position = admission.position(ticket)
+            if position is not None:
+                yield render_event(progress.queued_event(position, admission.estimate_wait(position)), [])
+            admission.wait(ticket, QUEUE_POLL_SECONDS)
+        
+        # The run deadline starts once the run does, not while it waits in line
+        context = RunContext()
+        active_runs.register(session, context)
+        
         # Initialize generator with provided API key
-        generator = ImageToGameGenerator(api_key.strip())
+        generator = new_generator(api_key.strip())
         
-        # Generate game - iterate over all yields
-        for result in generator.generate_game(image):
-            yield (
-                result['game_html'],
-                result['analysis'],
-                result['reflection']
-            )
+        log = []
+        if ticket.mode == DEGRADED:
+            # Under pressure: a template game over the photo now instead of a long wait
+            events = generator.generate_template_game(image, context, f"estimated wait {format_wait(ticket.wait)}")
+        else:
+            # Reuse the analysis started on upload (generate_game waits for it if still running)
+            speculator = get_speculator()
+            speculative = speculator.claim(image, api_key.strip()) if speculator is not None else None
+            events = generator.generate_game(image, speculative, context)
+        
+        # Generate game - each progress event updates only the components it changes
+        for event in events:
+            finished = finished or event['type'] == progress.RESULT
+            yield render_event(event, log)
         
+    except GeneratorExit:
+        # Gradio closed this generator: Stop was clicked or the client went away
+        if context is not None:
+            context.cancel("client disconnected")
+        raise
     except Exception as e:
+        logger.exception("Generation failed: %s", e)
         error_html = f"""
         <div style='padding: 20px; background: #1a1a1a; color: #ff4444; border-radius: 10px;'>
             <h3>❌ Error During Generation</h3>
@@ -54,6 +217,11 @@ def generate_game(image, api_key):
         </div>
         """
         yield (error_html, f"Error: {str(e)}", "")
+    finally:
+        admission.release(ticket, finished)
+        if context is not None:
+            active_runs.unregister(session, context)
+            context.close()
 
 # Create Gradio Interface
 with gr.Blocks(title="Image to Game Generator") as app:
@@ -84,6 +252,7 @@ with gr.Blocks(title="Image to Game Generator") as app:
                 label="Upload Your Image",
                 height=400
             )
+            speculation_key = gr.State(None)
             
             # Generate button
             generate_btn = gr.Button(
@@ -91,6 +260,7 @@ with gr.Blocks(title="Image to Game Generator") as app:
                 variant="primary",
                 size="lg"
             )
+            stop_btn = gr.Button("⏹ Stop", size="sm")
             
             gr.Markdown("""
             **⏱️ Generation takes 30-45 seconds**
@@ -144,17 +314,107 @@ with gr.Blocks(title="Image to Game Generator") as app:
     **Note:** Your API key is not stored. Each generation uses ~$0.10-0.20 in API credits.
     """)
     
+    # Start analysis as soon as an image is dropped in
+    image_input.change(
+        fn=speculate,
+        inputs=[image_input, api_key_input, speculation_key],
+        outputs=[speculation_key],
+        show_progress="hidden"
+    )
+    
     # Connect button to function
-    generate_btn.click(
+    generate_event = generate_btn.click(
         fn=generate_game,
         inputs=[image_input, api_key_input],
-        outputs=[game_output, analysis_output, reflection_output]
+        outputs=[game_output, analysis_output, reflection_output],
+        api_name="generate_game",
+        # Room for every admitted, queued and template run; admission decides which is which
+        concurrency_limit=admission.max_runs * 2 + admission.queue_size
     )
+    
+    # Stop aborts the in-flight Claude call too, not just the UI stream
+    stop_btn.click(fn=stop_generation, cancels=[generate_event], queue=False)
+    app.unload(cancel_on_disconnect)
+
+app.queue(max_size=GRADIO_QUEUE_SIZE)
+
+def game_permalink(request):
+    """Serve a saved game - no tokens spent, just a pre-compressed file from disk"""
+    from fastapi.responses import FileResponse, Response
+    
+    game_id = request.path_params["game_id"]
+    store = get_artifact_store()
+    manifest = store.load_game(game_id) if store else None
+    if manifest is None:
+        return Response("Game not found", status_code=404, media_type="text/plain")
+    
+    digest = manifest['document']
+    encoding = store.pick_encoding(digest, request.headers.get("accept-encoding"))
+    etag = f'"{digest[:32]}-{encoding}"' if encoding else f'"{digest[:32]}"'
+    headers = {
+        "ETag": etag,
+        # Content-addressed, so a game never changes
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+        # Model-written HTML/JS on our own origin: sandbox it like the srcdoc iframe
+        "Content-Security-Policy": "sandbox allow-scripts"
+    }
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(store.blob_path(digest, encoding), media_type="text/html; charset=utf-8", headers=headers)
+
+# Games embedded in the UI post frame-time summaries to this page (game_runtime.perf_runtime_js);
+# forward them to /perf so gameplay smoothness shows up in the server logs
+PERF_LISTENER = f"""
+<script>
+window.addEventListener('message', function (e) {{
+    if (!e.data || e.data.type !== '{PERF_MESSAGE_TYPE}') return;
+    navigator.sendBeacon('/perf', new Blob([JSON.stringify(e.data)], {{type: 'application/json'}}));
+}});
+</script>
+"""
+
+async def game_perf(request):
+    """Frame-time summary from an embedded game"""
+    from fastapi.responses import Response
+    
+    try:
+        report = json.loads(await request.body())
+    except ValueError:
+        return Response(status_code=400)
+    if not isinstance(report, dict):
+        return Response(status_code=400)
+    
+    fields = {k: report[k] for k in ("fps", "frameMs", "frameP95Ms", "longFrames", "frames")
+              if isinstance(report.get(k), (int, float))}
+    logger.info("Game perf [%s]: %s", str(report.get('title', ''))[:80], fields, extra={"game_perf": fields})
+    return Response(status_code=204)
+
+def create_server():
+    """Gradio mounted on a FastAPI app so saved games and perf reports get their own routes"""
+    from fastapi import FastAPI
+    
+    server = FastAPI()
+    # Plain Starlette routes: the handlers take the request and need no FastAPI types at import
+    server.add_route("/games/{game_id}", game_permalink, methods=["GET"])
+    server.add_route("/perf", game_perf, methods=["POST"])
+    return gr.mount_gradio_app(server, app, path="/", head=PERF_LISTENER)
 
 # Launch the app
 if __name__ == "__main__":
-    app.launch(
-        server_name="0.0.0.0",  # Important for HF Spaces
-        server_port=7860,
-        share=False
+    import uvicorn
+    
+    server = create_server()
+    # The page is served right away; the generation stack loads while the user picks an image
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+    
+    uvicorn.run(
+        server,
+        host="0.0.0.0",  # Important for HF Spaces
+        port=int(os.getenv("GRADIO_SERVER_PORT", "7860"))
     )
\ No newline at end of file
@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+
+# Blob types worth pre-compressing (images are already compressed)
+COMPRESSIBLE_TYPES = ("text/", "application/json")
+
+# Compression runs on the request thread when a game is saved. Brotli's default
+# quality 11 takes ~200ms on a 100KB game for ~1% smaller output; 5 takes ~2ms.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _gzip_chunks(chunks):
+    # Same bytes as gzip.compress(data, GZIP_LEVEL, mtime=0): wbits 31 writes the gzip
+    # header and trailer, with mtime 0 and no file name
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+def _brotli_chunks(chunks):
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        yield compressor.process(chunk)
+    yield compressor.finish()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated games on local disk.
+
+    Layout:
+      blobs/ab/abcdef...        raw content, named by its sha256
+      blobs/ab/abcdef....gz     gzip copy (text blobs only)
+      blobs/ab/abcdef....br     brotli copy (text blobs only, if brotli is installed)
+      games/<game_id>.json      manifest pointing at the blobs of one game
+
+    Identical components (same image, same CSS...) are stored once no matter
+    how many games use them. A game's id is the hash of its manifest, so
+    saving the same game twice is a no-op.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "games"), exist_ok=True)
+
+    def blob_path(self, digest, encoding=None):
+        """Path of a stored blob; encoding is None, 'gzip' or 'br'"""
+        suffix = {None: "", "gzip": ".gz", "br": ".br"}[encoding]
+        return os.path.join(self.root, "blobs", digest[:2], digest + suffix)
+
+    def put_blob(self, data, content_type):
+        """
+        Store bytes, a str or a list of str parts (an assembled game, see assemble_game)
+        by content hash and return the digest. Parts are hashed, compressed and written
+        one at a time, so the whole document and its compressed copies are never in memory.
+        """
+        if isinstance(data, (bytes, str)):
+            data = [data]
+        chunks = lambda: (part.encode("utf-8") if isinstance(part, str) else part for part in data)
+
+        sha = hashlib.sha256()
+        for chunk in chunks():
+            sha.update(chunk)
+        digest = sha.hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            # Write compressed copies first so a visible raw blob always has them
+            self._write_atomic(self.blob_path(digest, "gzip"), _gzip_chunks(chunks()))
+            if brotli is not None:
+                self._write_atomic(self.blob_path(digest, "br"), _brotli_chunks(chunks()))
+        self._write_atomic(path, chunks())
+        return digest
+
+    def _write_atomic(self, path, data):
+        """Write bytes or an iterable of bytes chunks to path, all or nothing"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    for chunk in data:
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def save_game(self, document, spec, analysis, image, components=None):
+        """
+        Save an assembled game with everything it was built from.
+        document is a string or the list of parts from assemble_game;
+        image is a rendition dict from image_pipeline; components is {'html':..., 'css':..., 'js':...}.
+        Returns the game id used in the permalink.
+        """
+        manifest = {
+            "title": spec.get("title", "Photo Game"),
+            "document": self.put_blob(document, "text/html"),
+            "spec": self.put_blob(json.dumps(spec, sort_keys=True), "application/json"),
+            "analysis": self.put_blob(analysis, "text/plain"),
+            "image": self.put_blob(base64.b64decode(image["data"]), image["media_type"]),
+            "image_type": image["media_type"],
+            "components": {
+                name: self.put_blob(code or "", "text/plain")
+                for name, code in (components or {}).items()
+            },
+        }
+
+        game_id = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+        manifest_path = os.path.join(self.root, "games", game_id + ".json")
+        if not os.path.exists(manifest_path):
+            manifest["created"] = int(time.time())
+            self._write_atomic(manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        return game_id
+
+    def encoded_sizes(self, digest):
+        """Bytes on disk of a blob and of each pre-compressed copy, e.g. {'identity': n, 'gzip': n, 'br': n}"""
+        sizes = {}
+        for name, encoding in (("identity", None), ("gzip", "gzip"), ("br", "br")):
+            path = self.blob_path(digest, encoding)
+            if os.path.exists(path):
+                sizes[name] = os.path.getsize(path)
+        return sizes
+
+    def load_game(self, game_id):
+        """Return a game's manifest, or None if it doesn't exist"""
+        # ids are hex, anything else could escape the store directory
+        if not game_id or not all(c in "0123456789abcdef" for c in game_id):
+            return None
+        try:
+            with open(os.path.join(self.root, "games", game_id + ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def pick_encoding(self, digest, accept_encoding):
+        """Best pre-compressed copy the client accepts: 'br', 'gzip' or None"""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            name, _, params = part.partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0"):
+                accepted.add(name.strip())
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and os.path.exists(self.blob_path(digest, encoding)):
+                return encoding
+        return None
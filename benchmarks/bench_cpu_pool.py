@@ -0,0 +1,125 @@
+"""
+Benchmark the CPU stages (image renditions in the pool, srcdoc escaping inline) under concurrent uploads.
+
+Simulates N Gradio worker threads each handling an upload at the same time and
+reports per-upload latency percentiles for every CPU_POOL_MODE, plus how late a
+10ms heartbeat on the main thread fires (a stand-in for event loop stalls).
+"cold" is the first upload on a pool that was never started (what the first user
+pays unless app.preload warmed it); the percentiles are on a warm pool. Process
+workers re-import this script as __mp_main__, so a heavy main module (app.py)
+makes the cold number much worse than here.
+
+    python benchmarks/bench_cpu_pool.py --users 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cpu_pool
+from cpu_pool import run_cpu
+from game_document import srcdoc_iframe
+from image_pipeline import prepare_renditions, data_uri
+
+
+def make_photo(path, size):
+    """Write a photo-like JPEG (smooth gradients plus sensor noise)"""
+    import numpy as np
+    from PIL import Image
+
+    w, h = size
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    rgb = np.stack([
+        128 + 100 * np.sin(x / 300.0),
+        128 + 100 * np.cos(y / 200.0),
+        128 + 60 * np.sin((x + y) / 500.0),
+    ], axis=-1)
+    rgb += np.random.default_rng(0).normal(0, 12, rgb.shape)
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def one_upload(image_path):
+    start = time.perf_counter()
+    images = run_cpu(prepare_renditions, image_path)
+    # Roughly the size of a real assembled game: ~12KB of markup/JS plus the background
+    document = "<html><body><script>" + ("let a = \"b\" & 'c';\n" * 600)
+    document += data_uri(images["display"]) + "</script></body></html>"
+    srcdoc_iframe(document)
+    return time.perf_counter() - start
+
+
+def heartbeat(stop, lags, interval=0.01):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        time.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+def run_mode(mode, image_path, users, workers):
+    cpu_pool.shutdown()
+    cpu_pool.CPU_POOL_MODE = mode
+    cpu_pool.CPU_POOL_WORKERS = workers
+    # First upload on a fresh pool: worker start-up and imports included
+    cold = one_upload(image_path)
+    cpu_pool.warm()
+
+    lags = []
+    stop = threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(stop, lags), daemon=True)
+    beat.start()
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as gradio_workers:
+        latencies = list(gradio_workers.map(one_upload, [image_path] * users))
+    wall = time.perf_counter() - wall
+
+    stop.set()
+    beat.join()
+    cpu_pool.shutdown()
+
+    return {
+        "mode": mode,
+        "cold": cold,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "wall": wall,
+        "lag_p99": percentile(lags, 99) if lags else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="concurrent uploads")
+    parser.add_argument("--workers", type=int, default=cpu_pool.CPU_POOL_WORKERS, help="pool size")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--modes", default="inline,thread,process")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "upload.jpg")
+        make_photo(image_path, (args.width, args.height))
+        print(f"{args.users} concurrent uploads of a {args.width}x{args.height} JPEG, "
+              f"{args.workers} pool workers, {os.cpu_count()} CPUs\n")
+
+        print(f"{'mode':<8} {'cold':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'wall':>8} {'hb lag p99':>11}")
+        for mode in args.modes.split(","):
+            r = run_mode(mode.strip(), image_path, args.users, args.workers)
+            print(f"{r['mode']:<8} {r['cold']:>7.2f}s {r['p50']:>7.2f}s {r['p95']:>7.2f}s {r['p99']:>7.2f}s "
+                  f"{r['wall']:>7.2f}s {r['lag_p99'] * 1000:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
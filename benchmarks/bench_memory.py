@@ -0,0 +1,125 @@
+"""
+Peak Python memory per generation session, measured with tracemalloc.
+
+Runs N concurrent sessions (threads, one generator each, distinct images) of the
+full pipeline against benchmarks/fake_anthropic.py, which runs as a subprocess so
+its allocations aren't traced. The CPU pool runs inline so image work is traced
+too, and the memo and near-duplicate index are off so nothing is shared between
+sessions. For each level it reports the traced peak above the idle baseline, per
+session, and what is still held once the sessions are done. With
+--max-mb-per-session it exits non-zero if a level goes over that ceiling.
+
+    python benchmarks/bench_memory.py --levels 1,4,8 --max-mb-per-session 1.5
+"""
+import argparse
+import gc
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("CPU_POOL_MODE", "inline")
+os.environ.setdefault("COMPONENT_MEMO", "0")
+os.environ.setdefault("PHASH_INDEX", "0")
+os.environ.setdefault("SPECULATIVE_ANALYSIS", "0")
+
+from load_test import free_port, make_images
+
+MB = 1024 * 1024
+
+
+def start_fake_api(speed):
+    port = free_port()
+    api = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_anthropic.py"), "--port", str(port),
+                            "--speed", str(speed)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return api, port
+        except OSError:
+            time.sleep(0.1)
+    api.terminate()
+    raise RuntimeError("fake API did not start")
+
+
+def session(image, errors):
+    """One user's generation, start to finished game, like app.generate_game drives it"""
+    from game_generator import ImageToGameGenerator
+
+    try:
+        generator = ImageToGameGenerator("sk-ant-bench")
+        result = None
+        for event in generator.generate_game(image):
+            if event['type'] == "result":
+                result = event
+            elif event['type'] == "error":
+                errors.append(event['message'])
+        if result is None:
+            errors.append("no game")
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+
+
+def run_level(images, sessions):
+    """(peak MB above baseline, MB still held after the sessions, errors)"""
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    errors = []
+    threads = [threading.Thread(target=session, args=(images[i % len(images)], errors)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    peak = tracemalloc.get_traced_memory()[1]
+    gc.collect()
+    return (peak - baseline) / MB, (tracemalloc.get_traced_memory()[0] - baseline) / MB, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,4,8", help="concurrent sessions per level")
+    parser.add_argument("--speed", type=float, default=20.0, help="fake API latency divisor")
+    parser.add_argument("--max-mb-per-session", type=float, default=0, help="fail above this peak per session")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    api, port = start_fake_api(args.speed)
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="bench_memory_")
+    os.environ.setdefault("ARTIFACT_DIR", os.path.join(workdir, "artifacts"))
+    images = make_images(workdir, max(levels))
+
+    failed = False
+    try:
+        # Imports, SDK setup and first-call caches aren't per-session memory
+        session(images[0], [])
+        tracemalloc.start()
+        print(f"{'sessions':>8} {'peak':>9} {'per session':>12} {'held after':>11}  errors")
+        for sessions in levels:
+            peak, held, errors = run_level(images, sessions)
+            per_session = peak / sessions
+            over = args.max_mb_per_session and per_session > args.max_mb_per_session
+            failed = failed or over or bool(errors)
+            print(f"{sessions:>8} {peak:>7.2f}MB {per_session:>10.2f}MB {held:>9.2f}MB  "
+                  f"{len(errors)}{'  OVER CEILING' if over else ''}")
+            for error in sorted(set(errors))[:3]:
+                print(f"         error: {error[:120]}")
+    finally:
+        tracemalloc.stop()
+        api.terminate()
+        api.wait()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark the output minifier on the game runtime plus a generated-style game.
+
+Prints size before/after minification (raw, srcdoc-escaped, gzip) and the time
+it takes, and checks the minified JS still parses with node when it is on PATH.
+
+    python benchmarks/bench_minify.py --runs 20
+"""
+import argparse
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_document import srcdoc_iframe
+from game_runtime import perf_runtime_js, world_runtime_js
+from minifier import minify_css, minify_html, minify_js
+
+# Shaped like the components the model writes: indented, commented, many small functions
+SAMPLE_HTML = """
+    <div id="gameContainer">
+        <!-- HUD -->
+        <h1>Kitchen Quest</h1>
+        <div class="hud">
+            <span>Score: <span id="score">0</span></span>
+            <span>Time: <span id="timer">60</span></span>
+        </div>
+        <canvas id="gameCanvas" width="800" height="600"></canvas>
+    </div>
+"""
+
+SAMPLE_CSS = """
+    /* Layout */
+    #gameContainer {
+        text-align: center;
+        font-family: 'Trebuchet MS', sans-serif;
+    }
+
+    .hud > span {
+        margin: 0 12px;
+        color: #333;
+    }
+"""
+
+SAMPLE_FUNCTION = """
+    // Move the player, blocked by nearby obstacles
+    function updatePlayer{i}(dt) {{
+        const speed = player.speed * dt / 16;
+        let nx = player.x, ny = player.y;
+        if (keys['ArrowLeft']) nx -= speed;
+        if (keys['ArrowRight']) nx += speed;
+        const hit = GameWorld.nearby(nx, ny, player.size, player.size).some((o) =>
+            nx < o.x + o.width && nx + player.size > o.x && ny < o.y + o.height && ny + player.size > o.y
+        );
+        if (!hit) {{ player.x = nx; player.y = ny; }}
+        document.getElementById('score').textContent = `${{score}} / ${{collectibles.length}}`;
+    }}
+"""
+
+
+def sample_js(functions):
+    return "\n".join(SAMPLE_FUNCTION.format(i=i) for i in range(functions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--functions", type=int, default=40, help="size of the sample game JS")
+    args = parser.parse_args()
+
+    spec = {"obstacles": [{"name": f"o{i}", "x": i * 50, "y": 300, "width": 40, "height": 40} for i in range(12)],
+            "collectibles": [], "player": {"startX": 10, "startY": 10, "size": 25}}
+    js = "\n".join([perf_runtime_js(), world_runtime_js(spec), sample_js(args.functions)])
+
+    def document(html, css, script):
+        return f"<!DOCTYPE html><html><head><style>{css}</style></head><body>{html}<script>{script}</script></body></html>"
+
+    raw = document(SAMPLE_HTML, SAMPLE_CSS, js)
+    latencies = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        minified_js = minify_js(js)
+        minified = document(minify_html(SAMPLE_HTML), minify_css(SAMPLE_CSS), minified_js)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    print(f"{'':<10} {'raw':>9} {'srcdoc':>9} {'gzip':>9}")
+    for name, doc in (("original", raw), ("minified", minified)):
+        data = doc.encode("utf-8")
+        print(f"{name:<10} {len(data):>9} {len(srcdoc_iframe(doc)):>9} {len(gzip.compress(data, 6)):>9}")
+    print(f"\nMinify p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms "
+          f"({len(js)} chars of JS)")
+
+    if shutil.which("node"):
+        result = subprocess.run(["node", "-e", "new Function(process.argv[1])", minified_js],
+                                capture_output=True, text=True)
+        print("Minified JS parses with node" if result.returncode == 0 else f"node: {result.stderr.strip()}")
+
+
+if __name__ == "__main__":
+    main()
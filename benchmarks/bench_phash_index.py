@@ -0,0 +1,87 @@
+"""
+Benchmark near-duplicate lookup in the perceptual-hash index.
+
+Fills a PerceptualIndex with N random 64-bit hashes, then times lookups of
+near-duplicates (a few bits flipped) and of unrelated hashes, and compares
+against a brute-force NumPy XOR/popcount scan over the same hashes.
+
+    python benchmarks/bench_phash_index.py --size 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_index import PerceptualIndex, PHASH_MAX_DISTANCE
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def flip_bits(rng, phash, count):
+    for bit in rng.choice(64, size=count, replace=False):
+        phash ^= 1 << int(bit)
+    return phash
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000, help="stored hashes")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--distance", type=int, default=PHASH_MAX_DISTANCE, help="max Hamming distance")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    stored = [int(h) for h in rng.integers(0, 2**64, size=args.size, dtype=np.uint64)]
+
+    index = PerceptualIndex(max_distance=args.distance, max_entries=args.size)
+    start = time.perf_counter()
+    for i, h in enumerate(stored):
+        index.add(h, i)
+    print(f"Indexed {len(index)} hashes in {time.perf_counter() - start:.2f}s "
+          f"(max distance {args.distance}, {index.chunks} tables)\n")
+
+    picks = rng.integers(0, args.size, size=args.queries)
+    near = [flip_bits(rng, stored[i], int(rng.integers(1, args.distance + 1))) for i in picks]
+    unrelated = [int(h) for h in rng.integers(0, 2**64, size=args.queries, dtype=np.uint64)]
+
+    array = np.array(stored, dtype=np.uint64)
+
+    def brute_force(q):
+        distances = np.bitwise_count(array ^ np.uint64(q))
+        best = int(distances.argmin())
+        return (int(distances[best]), best) if distances[best] <= args.distance else None
+
+    print(f"{'lookup':<22} {'mean':>9} {'p50':>9} {'p99':>9} {'hits':>7}")
+    for name, fn, queries in (
+        ("index, near-dup", index.lookup, near),
+        ("index, unrelated", index.lookup, unrelated),
+        ("brute force, near-dup", brute_force, near[:200]),
+    ):
+        latencies, results = timed(fn, queries)
+        hits = sum(r is not None for r in results)
+        print(f"{name:<22} {sum(latencies) / len(latencies) * 1e6:>7.1f}us "
+              f"{percentile(latencies, 50) * 1e6:>7.1f}us {percentile(latencies, 99) * 1e6:>7.1f}us "
+              f"{hits:>3}/{len(queries)}")
+
+    missed = sum(index.lookup(q) is None for q in near)
+    print(f"\nNear-duplicates missed by the index: {missed}")
+
+
+if __name__ == "__main__":
+    main()
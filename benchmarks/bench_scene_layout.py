@@ -0,0 +1,63 @@
+"""
+Benchmark the local obstacle / free-space segmentation (scene_layout.propose_layout).
+
+Times it on the 800x600 display rendition of a photo-like image and of a
+synthetic scene with known objects, and prints the rectangles it proposes.
+
+    python benchmarks/bench_scene_layout.py --runs 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scene_layout import propose_layout
+
+
+def make_scene():
+    """Noisy floor with three furniture-like blocks at known positions"""
+    rng = np.random.default_rng(1)
+    floor = np.full((600, 800, 3), [200, 190, 170], np.float32) + rng.normal(0, 8, (600, 800, 3))
+    img = Image.fromarray(floor.clip(0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([100, 300, 300, 450], fill=(90, 50, 20))
+    draw.rectangle([500, 100, 650, 250], fill=(30, 120, 40))
+    draw.ellipse([600, 400, 760, 560], fill=(40, 40, 160))
+    return img
+
+
+def make_photo():
+    """Smooth gradients plus sensor noise, like bench_cpu_pool"""
+    y, x = np.mgrid[0:600, 0:800].astype(np.float32)
+    rgb = np.stack([128 + 100 * np.sin(x / 75.0), 128 + 100 * np.cos(y / 50.0),
+                    128 + 60 * np.sin((x + y) / 125.0)], axis=-1)
+    rgb += np.random.default_rng(0).normal(0, 12, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, img in (("scene", make_scene()), ("photo", make_photo())):
+        propose_layout(img)
+        latencies = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            layout = propose_layout(img)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{name}: p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+              f"max {latencies[-1] * 1000:.1f}ms")
+        for rect in layout["obstacles"] + layout["free"]:
+            print(f"  {rect['name']:<9} x={rect['x']:<4} y={rect['y']:<4} {rect['width']}x{rect['height']}")
+
+
+if __name__ == "__main__":
+    main()
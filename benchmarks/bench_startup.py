@@ -0,0 +1,91 @@
+"""
+Benchmark cold start: import time of app.py and time until the first page is served.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and prints the
+slowest modules app.py imports, compares it with also importing the generation stack
+(deferred until first use), then starts `python app.py` on a free port and times
+how long until GET / returns 200.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(statement):
+    """(wall seconds, [(cumulative us, module)] of what app imports directly) for a fresh interpreter"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level under the module that triggered them
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            modules.append((int(cumulative), name.strip()))
+    return wall, sorted(modules, reverse=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_page(timeout=120):
+    """Seconds from launching app.py until / answers 200"""
+    port = free_port()
+    env = dict(os.environ, GRADIO_SERVER_PORT=str(port), LOG_LEVEL="WARNING")
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"app.py exited with {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="slowest imports to list")
+    args = parser.parse_args()
+
+    wall, modules = import_profile("import app")
+    print(f"import app: {wall:.2f}s wall, slowest imports it triggers:")
+    for cumulative, name in modules[:args.top]:
+        print(f"  {cumulative / 1e6:>6.2f}s  {name}")
+
+    eager, _ = import_profile("import app, game_generator, anthropic")
+    print(f"\nimport app + generation stack (the old eager startup): {eager:.2f}s wall "
+          f"({eager - wall:+.2f}s)")
+
+    firsts = [time_to_first_page() for _ in range(args.runs)]
+    print(f"\nTime to first page: median {statistics.median(firsts):.2f}s, "
+          f"min {min(firsts):.2f}s, max {max(firsts):.2f}s over {args.runs} starts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Offline A/B evaluation of prompt variants (see prompts.py) over an image corpus.
+
+Every image is run through the full pipeline once per variant (--runs times,
+variants interleaved so API drift hits them alike), with the component memo,
+the near-duplicate index and hedging off so every stage really calls Claude.
+Per variant it reports output/input tokens, Claude time and wall time per run,
+first-pass verification rate per stage and repairs per run, then a per-stage
+breakdown by prompt id.
+
+A variant is name=PROMPT_VERSIONS, e.g. "terse=js=v2,css=v2" ("baseline=" is all v1).
+
+    python benchmarks/eval_prompts.py --images photos/ --variant baseline= --variant terse=js=v2,css=v2
+    python benchmarks/eval_prompts.py --fake --speed 20     # check the harness against fake_anthropic
+"""
+import argparse
+import collections
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from prompts import prompts, parse_versions
+
+CHECKED_STAGES = ("spec", "html", "css", "js")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def parse_variant(value):
+    name, _, versions = value.partition("=")
+    return name, parse_versions(versions)
+
+
+def default_variants():
+    """Baseline (all v1) and every prompt that has a v2, switched together"""
+    v2 = {name: "v2" for name in prompts.names() if "v2" in prompts.versions(name)}
+    return [("baseline", {}), ("v2", v2)]
+
+
+def corpus(directory, limit):
+    if directory:
+        paths = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                       if f.lower().endswith(IMAGE_EXTENSIONS))
+    else:
+        from load_test import make_images
+        paths = make_images(tempfile.mkdtemp(prefix="eval_prompts_"), limit or 3)
+    return paths[:limit] if limit else paths
+
+
+def run_once(api_key, image, versions):
+    """One pipeline run with these prompt versions: a record of its calls and verifications"""
+    from game_generator import ImageToGameGenerator
+
+    generator = ImageToGameGenerator(api_key)
+    generator.prompt_versions = versions
+    generator.component_memo = None
+    generator.scene_index = None
+    generator.artifact_store = None
+    generator.hedge_candidates = 1
+
+    start = time.perf_counter()
+    finished = False
+    for event in generator.generate_game(image):
+        finished = finished or event['type'] == "result"
+    wall = time.perf_counter() - start
+
+    first_pass = {}
+    for stage, passed in generator.verifications:
+        first_pass.setdefault(stage, passed)
+    return {
+        "image": os.path.basename(image),
+        "ok": finished,
+        "wall": wall,
+        "calls": generator.budget.calls,
+        "first_pass": first_pass,
+        "repairs": sum(stage.startswith("repair_") for stage, _ in generator.verifications),
+    }
+
+
+def mean(values):
+    return statistics.mean(values) if values else float("nan")
+
+
+def report(results):
+    print(f"\n{'variant':<12} {'runs':>4} {'ok':>3} {'out tok':>8} {'in tok':>8} {'claude s':>9} {'wall s':>7} "
+          f"{'repairs':>7} " + " ".join(f"{'1st ' + stage:>8}" for stage in CHECKED_STAGES))
+    for variant, runs in results.items():
+        first = {stage: [r["first_pass"][stage] for r in runs if stage in r["first_pass"]] for stage in CHECKED_STAGES}
+        print(f"{variant:<12} {len(runs):>4} {sum(r['ok'] for r in runs):>3} "
+              f"{mean([sum(c['output_tokens'] for c in r['calls']) for r in runs]):>8.0f} "
+              f"{mean([sum(c['input_tokens'] for c in r['calls']) for r in runs]):>8.0f} "
+              f"{mean([sum(c['latency'] for c in r['calls']) for r in runs]):>9.1f} "
+              f"{mean([r['wall'] for r in runs]):>7.1f} {mean([r['repairs'] for r in runs]):>7.2f} " +
+              " ".join(f"{sum(first[stage]) / len(first[stage]):>8.0%}" if first[stage] else f"{'-':>8}"
+                       for stage in CHECKED_STAGES))
+
+    print(f"\n{'variant':<12} {'prompt':<22} {'calls':>5} {'out tok':>8} {'in tok':>8} {'latency':>8}")
+    for variant, runs in results.items():
+        by_prompt = collections.defaultdict(list)
+        for run in runs:
+            for call in run["calls"]:
+                by_prompt[call.get("prompt") or call["stage"]].append(call)
+        for prompt_id, calls in sorted(by_prompt.items()):
+            print(f"{variant:<12} {prompt_id:<22} {len(calls):>5} {mean([c['output_tokens'] for c in calls]):>8.0f} "
+                  f"{mean([c['input_tokens'] for c in calls]):>8.0f} {mean([c['latency'] for c in calls]):>7.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", help="directory of images (default: a few synthetic ones)")
+    parser.add_argument("--limit", type=int, default=0, help="use at most this many images")
+    parser.add_argument("--variant", action="append", default=[], help="name=PROMPT_VERSIONS, repeatable")
+    parser.add_argument("--runs", type=int, default=1, help="runs per image and variant")
+    parser.add_argument("--fake", action="store_true", help="run against benchmarks/fake_anthropic.py")
+    parser.add_argument("--speed", type=float, default=10.0, help="fake API latency divisor")
+    parser.add_argument("--json", help="write every run record to this file")
+    args = parser.parse_args()
+
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if args.fake:
+        from fake_anthropic import LatencyModel, serve
+        api = serve(0, LatencyModel(speed=args.speed, seed=0))
+        os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{api.server_port}"
+        api_key = "sk-ant-eval"
+    if not api_key:
+        parser.error("set ANTHROPIC_API_KEY (or use --fake)")
+
+    variants = [parse_variant(v) for v in args.variant] or default_variants()
+    for name, versions in variants:
+        for prompt_name, version in versions.items():
+            prompts.get(prompt_name, version)  # fail fast on unknown prompt versions
+        print(f"{name}: {', '.join(f'{k}={v}' for k, v in versions.items()) or 'all v1'}")
+
+    images = corpus(args.images, args.limit)
+    results = {name: [] for name, _ in variants}
+    for image in images:
+        for _ in range(args.runs):
+            for name, versions in variants:
+                record = run_once(api_key, image, versions)
+                results[name].append(record)
+                print(f"  {name:<12} {record['image']:<24} {'ok' if record['ok'] else 'FAILED':<6} "
+                      f"{sum(c['output_tokens'] for c in record['calls']):>6} out tok, {record['wall']:.1f}s, "
+                      f"{record['repairs']} repairs", flush=True)
+
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"variants": dict(variants), "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Local stand-in for the Anthropic Messages API, for load tests.
+
+Answers POST /v1/messages with server-sent events in the SDK's streaming format
+(text, or tool_use for the combined analysis + design call). Each answer passes
+the generator's verification. Latency is time-to-first-token plus output tokens
+streamed at a per-call speed, both drawn from log-normal distributions per stage.
+The defaults are roughly what a real run shows (analysis ~10s, JS ~45s).
+Point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+
+    python benchmarks/fake_anthropic.py --port 8787 --speed 10
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SPEC = {
+    "title": "Load Test Quest", "theme": "bedroom",
+    "contracts": {"canvas_id": "gameCanvas", "score_id": "score", "timer_id": "timer", "container_id": "gameContainer"},
+    "player": {"startX": 50, "startY": 500, "size": 25, "speed": 4},
+    "obstacles": [{"name": "Bed", "x": 300, "y": 300, "width": 150, "height": 100, "color": "#8B4513"}],
+    "collectibles": [{"name": "Lamp", "x": 600, "y": 450, "size": 15, "color": "#FFD700"},
+                     {"name": "Book", "x": 100, "y": 100, "size": 15, "color": "#FFD700"}],
+    "goal": {"name": "Door", "x": 700, "y": 50, "width": 60, "height": 60},
+}
+ANALYSIS = ("1. SCENE TYPE: bedroom\n2. MAIN OBJECTS: bed (center), lamp (right), books (top left)\n"
+            "3. COLLECTIBLES: lamp, book\n4. GOAL: door\n5. GAME THEME: tidy-up\n6. PLAYER START: bottom left")
+HTML = ('<div id="gameContainer"><h1>Load Test Quest</h1><div id="score">Score: 0/2</div>'
+        '<div id="timer">0</div><canvas id="gameCanvas" width="800" height="600"></canvas></div>')
+CSS = "#gameContainer { text-align: center; }\n#gameCanvas { border: 3px solid #00ff88; }\n"
+JS = """const canvas = document.getElementById('gameCanvas');
+const ctx = canvas.getContext('2d');
+const scoreEl = document.getElementById('score');
+const timerEl = document.getElementById('timer');
+const bgImage = new Image();
+bgImage.onload = () => { startGame(); };
+bgImage.src = 'PLACEHOLDER_IMAGE_DATA';
+function startGame() { requestAnimationFrame(gameLoop); }
+function gameLoop() { draw(); requestAnimationFrame(gameLoop); }
+function draw() { ctx.clearRect(0, 0, 800, 600); GameWorld.drawStatic(ctx, bgImage); }
+"""
+
+# stage: (median output tokens, median time to first token in s)
+STAGES = {
+    "analysis": (450, 1.5),
+    "design": (1400, 2.0),
+    "spec": (900, 1.0),
+    "positions": (150, 0.8),
+    "html": (250, 0.8),
+    "css": (400, 0.8),
+    "js": (2600, 1.0),
+}
+
+
+def classify(body):
+    """Which pipeline stage a request comes from, and the answer that passes its verification"""
+    content = body["messages"][0]["content"]
+    text = content if isinstance(content, str) else " ".join(c.get("text", "") for c in content if isinstance(c, dict))
+    first_line = text.strip().split("\n", 1)[0]
+    if body.get("tools"):
+        return "design", {"analysis": ANALYSIS, "spec": SPEC}
+    if "collectible" in first_line:
+        return "positions", json.dumps(SPEC["collectibles"])
+    if "Analyze this image" in first_line:
+        return "analysis", ANALYSIS
+    if "game specification" in first_line:
+        return "spec", "```json\n" + json.dumps(SPEC, indent=2) + "\n```"
+    if "HTML" in first_line:
+        return "html", "```html\n" + HTML + "\n```"
+    if "CSS" in first_line:
+        return "css", CSS
+    return "js", "```javascript\n" + JS + "\n```"
+
+
+class LatencyModel:
+    """Log-normal time-to-first-token and streaming speed; speed > 1 makes everything faster"""
+
+    def __init__(self, speed=1.0, tokens_per_second=60.0, sigma=0.35, error_rate=0.0, seed=None):
+        self.speed = speed
+        self.tokens_per_second = tokens_per_second
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self, stage):
+        """(time to first token, output tokens, seconds to stream them, overloaded?)"""
+        tokens, ttft = STAGES[stage]
+        with self.lock:
+            ttft *= self.rng.lognormvariate(0, self.sigma)
+            tokens = max(1, int(tokens * self.rng.lognormvariate(0, self.sigma / 2)))
+            rate = self.tokens_per_second * self.rng.lognormvariate(0, self.sigma / 2)
+            overloaded = self.rng.random() < self.error_rate
+        return ttft / self.speed, tokens, tokens / rate / self.speed, overloaded
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    model = None  # LatencyModel, set by serve()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+        stage, answer = classify(body)
+        ttft, output_tokens, stream_seconds, overloaded = self.model.draw(stage)
+        time.sleep(ttft)
+
+        if overloaded:
+            # The SDK retries 529 with backoff, like a real overload
+            error = json.dumps({"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}).encode()
+            self.send_response(529)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(error)))
+            self.end_headers()
+            self.wfile.write(error)
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        try:
+            self._stream(body, answer, output_tokens, stream_seconds)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client aborted the call (cancelled run)
+
+    def _event(self, name, data):
+        chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.flush()
+
+    def _stream(self, body, answer, output_tokens, stream_seconds):
+        input_tokens = len(json.dumps(body["messages"])) // 4
+        self._event("message_start", {"type": "message_start", "message": {
+            "id": "msg_" + uuid.uuid4().hex[:24], "type": "message", "role": "assistant", "model": body["model"],
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": 1}}})
+
+        if isinstance(answer, dict):
+            text = json.dumps(answer)
+            block = {"type": "tool_use", "id": "toolu_" + uuid.uuid4().hex[:24], "name": body["tools"][0]["name"], "input": {}}
+            delta = lambda piece: {"type": "input_json_delta", "partial_json": piece}
+        else:
+            text = answer
+            block = {"type": "text", "text": ""}
+            delta = lambda piece: {"type": "text_delta", "text": piece}
+        self._event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+
+        # The answer is short, so it is spread evenly over the time the tokens would take
+        chunks = max(1, min(len(text), output_tokens // 20))
+        size = -(-len(text) // chunks)
+        for start in range(0, len(text), size):
+            time.sleep(stream_seconds / chunks)
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": delta(text[start:start + size])})
+
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta",
+                                      "delta": {"stop_reason": "tool_use" if block["type"] == "tool_use" else "end_turn",
+                                                "stop_sequence": None},
+                                      "usage": {"output_tokens": output_tokens}})
+        self._event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def serve(port=0, model=None):
+    """Start the fake API on a background thread, returns the server (server.server_port)"""
+    handler = type("Handler", (FakeAnthropicHandler,), {"model": model or LatencyModel()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-anthropic", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--speed", type=float, default=1.0, help="latency divisor, e.g. 10 for a quick run")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered 529 overloaded")
+    args = parser.parse_args()
+
+    server = serve(args.port, LatencyModel(speed=args.speed, error_rate=args.error_rate))
+    print(f"Fake Anthropic API on http://127.0.0.1:{server.server_port} (speed x{args.speed})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
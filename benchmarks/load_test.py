@@ -0,0 +1,209 @@
+"""
+Load-test app.py with simulated concurrent users against a fake Anthropic API.
+
+Starts benchmarks/fake_anthropic.py in-process and `python app.py` pointed at it
+(ANTHROPIC_BASE_URL), then for each concurrency level runs that many virtual
+users, each with its own Gradio session (gradio_client), uploading a distinct
+image and calling the generate endpoint --runs times. For every level it reports
+throughput, end-to-end latency percentiles, queue wait (submit until the run
+starts, in Gradio's queue or the app's admission queue), RSS of the app and its
+CPU pool (start / peak / end), and how many requests admission control answered
+with a template game ("quick") or shed.
+Each virtual user has its own API key, since the app caps concurrent runs per key.
+
+    python benchmarks/load_test.py --levels 1,4,16 --runs 2 --speed 10
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_anthropic import LatencyModel, serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident set size in MB of a process and its descendants (the CPU pool), from Linux /proc"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            if current == pid:
+                return float("nan")
+    return total / 1024
+
+
+def make_images(directory, count):
+    """Distinct photo-like uploads, so near-duplicate reuse doesn't skip the analysis"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:900, 0:1200].astype(np.float32)
+    paths = []
+    for i in range(count):
+        fx, fy = rng.uniform(80, 400, size=2)
+        rgb = np.stack([128 + 100 * np.sin(x / fx + i), 128 + 100 * np.cos(y / fy),
+                        128 + 60 * np.sin((x + y) / (fx + fy))], axis=-1)
+        rgb += rng.normal(0, 12, rgb.shape)
+        path = os.path.join(directory, f"upload_{i}.jpg")
+        Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def start_app(port, api_port, artifact_dir, extra_env):
+    env = dict(os.environ, GRADIO_SERVER_PORT=str(port), ANTHROPIC_BASE_URL=f"http://127.0.0.1:{api_port}",
+               ARTIFACT_DIR=artifact_dir, LOG_LEVEL="WARNING", **extra_env)
+    app = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if app.poll() is not None:
+            raise RuntimeError(f"app.py exited with {app.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                return app
+        except OSError:
+            time.sleep(0.2)
+    app.terminate()
+    raise RuntimeError("app.py did not start")
+
+
+def virtual_user(url, image, api_key, runs, results):
+    """One browser session: upload an image and generate a game `runs` times"""
+    from gradio_client import Client, handle_file
+    from gradio_client.utils import Status
+
+    client = Client(url, verbose=False)
+    for _ in range(runs):
+        submitted = time.perf_counter()
+        started = None
+        outcome = "error"
+        try:
+            job = client.submit(handle_file(image), api_key, api_name="/generate_game")
+            while not job.done():
+                code = job.status().code
+                outputs = job.outputs()
+                # Waiting in Gradio's queue, or in the app's own admission queue (shown in the game area)
+                if (started is None and code not in (Status.STARTING, Status.JOINING_QUEUE, Status.IN_QUEUE)
+                        and outputs and "Waiting for a free slot" not in str(outputs[-1][0])):
+                    started = time.perf_counter()
+                time.sleep(0.05)
+            game_html, analysis, reflection = job.result()
+            error = None if "<iframe" in str(game_html) else (str(reflection).strip().splitlines() or ["no game"])[-1]
+            if error is None:
+                outcome = "quick" if "QUICK GAME" in str(reflection) else "full"
+            elif "Server Busy" in str(game_html):
+                outcome, error = "shed", None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finished = time.perf_counter()
+        results.append({
+            "latency": finished - submitted,
+            "queue_wait": (started or finished) - submitted,
+            "error": error,
+            "outcome": outcome,
+        })
+
+
+def run_level(url, pid, users, runs, images):
+    results = []
+    rss = [rss_mb(pid)]
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(0.2):
+            rss.append(rss_mb(pid))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user,
+                                args=(url, images[i % len(images)], f"sk-ant-load-test-{i}", runs, results))
+               for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    sampling.set()
+    sampler.join()
+    rss.append(rss_mb(pid))
+    return results, elapsed, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8", help="concurrent users per level")
+    parser.add_argument("--runs", type=int, default=2, help="generations per user per level")
+    parser.add_argument("--speed", type=float, default=10.0, help="fake API latency divisor (1 = realistic)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API calls answered 529")
+    parser.add_argument("--env", action="append", default=[], help="extra app env, e.g. --env HEDGE_CANDIDATES=2")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    api = serve(0, LatencyModel(speed=args.speed, error_rate=args.error_rate, seed=0))
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    images = make_images(workdir, max(levels))
+    port = free_port()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    app = start_app(port, api.server_port, os.path.join(workdir, "artifacts"), extra_env)
+    url = f"http://127.0.0.1:{port}/"
+    print(f"app.py pid {app.pid} on {url}, fake API x{args.speed} speed, error rate {args.error_rate:.0%}\n")
+
+    print(f"{'users':>5} {'ok':>5} {'quick':>5} {'shed':>4} {'err':>4} {'runs/min':>9} {'p50':>7} {'p90':>7} {'p99':>7} "
+          f"{'wait p50':>9} {'wait p90':>9} {'rss start':>10} {'peak':>7} {'end':>7}")
+    try:
+        for users in levels:
+            results, elapsed, rss = run_level(url, app.pid, users, args.runs, images)
+            ok = [r for r in results if r["outcome"] == "full"]
+            quick = sum(r["outcome"] == "quick" for r in results)
+            shed = sum(r["outcome"] == "shed" for r in results)
+            errors = sum(r["outcome"] == "error" for r in results)
+            latencies = [r["latency"] for r in ok]
+            waits = [r["queue_wait"] for r in results]
+            print(f"{users:>5} {len(ok):>5} {quick:>5} {shed:>4} {errors:>4} {len(ok) / elapsed * 60:>9.1f} "
+                  f"{percentile(latencies, 50):>6.1f}s {percentile(latencies, 90):>6.1f}s {percentile(latencies, 99):>6.1f}s "
+                  f"{percentile(waits, 50):>8.1f}s {percentile(waits, 90):>8.1f}s "
+                  f"{rss[0]:>8.0f}MB {max(rss):>5.0f}MB {rss[-1]:>5.0f}MB")
+            for error in sorted({r["error"] for r in results if r["error"]})[:3]:
+                print(f"      error: {error[:120]}")
+    finally:
+        app.terminate()
+        app.wait()
+        api.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+
+
+# USD per million tokens: (input, output)
+MODEL_PRICES = {
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+}
+DEFAULT_PRICE = (3.00, 15.00)
+
+# Per run (one generate_game call)
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "60000"))
+RUN_TIME_BUDGET = float(os.getenv("RUN_TIME_BUDGET", "240"))
+
+# Per API key, over a sliding window (0 = unlimited)
+KEY_TOKEN_BUDGET = int(os.getenv("KEY_TOKEN_BUDGET", "0"))
+KEY_TIME_BUDGET = float(os.getenv("KEY_TIME_BUDGET", "0"))
+KEY_WINDOW_SECONDS = float(os.getenv("KEY_WINDOW_SECONDS", "3600"))
+
+
+class BudgetExceeded(Exception):
+    """Raised when a required call doesn't fit in the run or key budget"""
+
+
+def key_fingerprint(api_key):
+    """Stable, non-reversible id for an API key (the key itself is never stored)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class KeyUsageLedger:
+    """Process-wide token and model-time usage per API key over a sliding window"""
+
+    def __init__(self, window=KEY_WINDOW_SECONDS):
+        self.window = window
+        self._usage = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def add(self, key_id, tokens, seconds):
+        with self._lock:
+            self._usage[key_id].append((time.time(), tokens, seconds))
+
+    def totals(self, key_id):
+        """(tokens, seconds) used by this key inside the window"""
+        cutoff = time.time() - self.window
+        with self._lock:
+            entries = self._usage[key_id]
+            while entries and entries[0][0] < cutoff:
+                entries.popleft()
+            return sum(e[1] for e in entries), sum(e[2] for e in entries)
+
+
+key_ledger = KeyUsageLedger()
+
+
+class BudgetAccountant:
+    """
+    Tracks response.usage for every Claude call in one run and enforces
+    token/time budgets for the run and for the API key.
+    """
+
+    def __init__(self, key_id, max_tokens=RUN_TOKEN_BUDGET, max_seconds=RUN_TIME_BUDGET,
+                 key_max_tokens=KEY_TOKEN_BUDGET, key_max_seconds=KEY_TIME_BUDGET, ledger=key_ledger):
+        self.key_id = key_id
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.key_max_tokens = key_max_tokens
+        self.key_max_seconds = key_max_seconds
+        self.ledger = ledger
+        self.started = time.perf_counter()
+        self.calls = []
+
+    @property
+    def input_tokens(self):
+        return sum(c["input_tokens"] for c in self.calls)
+
+    @property
+    def output_tokens(self):
+        return sum(c["output_tokens"] for c in self.calls)
+
+    @property
+    def tokens_used(self):
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def cost(self):
+        return sum(c["cost"] for c in self.calls)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def record(self, stage, model, response, latency, prompt=None):
+        """Account for one finished call; prompt is the id of the prompt template it used"""
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        price_in, price_out = MODEL_PRICES.get(model, DEFAULT_PRICE)
+
+        call = {
+            "stage": stage,
+            "model": model,
+            "prompt": prompt,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency": latency,
+            "cost": (input_tokens * price_in + output_tokens * price_out) / 1_000_000,
+        }
+        self.calls.append(call)
+        self.ledger.add(self.key_id, input_tokens + output_tokens, latency)
+        return call
+
+    def shortfall(self, estimated_tokens):
+        """Why a call of this size doesn't fit, or None if it does"""
+        if self.tokens_used + estimated_tokens > self.max_tokens:
+            return f"run token budget ({self.tokens_used}/{self.max_tokens} used)"
+        if self.elapsed > self.max_seconds:
+            return f"run time budget ({self.elapsed:.0f}s/{self.max_seconds:.0f}s)"
+
+        key_tokens, key_seconds = self.ledger.totals(self.key_id)
+        if self.key_max_tokens and key_tokens + estimated_tokens > self.key_max_tokens:
+            return f"API key token budget ({key_tokens}/{self.key_max_tokens} in window)"
+        if self.key_max_seconds and key_seconds > self.key_max_seconds:
+            return f"API key time budget ({key_seconds:.0f}s/{self.key_max_seconds:.0f}s in window)"
+        return None
+
+    def can_afford(self, estimated_tokens):
+        """For optional calls (repairs): skip them when the budget is low"""
+        return self.shortfall(estimated_tokens) is None
+
+    def check(self, stage, estimated_tokens):
+        """For required calls: raise BudgetExceeded if the call doesn't fit"""
+        reason = self.shortfall(estimated_tokens)
+        if reason:
+            raise BudgetExceeded(f"{stage} skipped: {reason}")
+
+    def summary(self):
+        """One-line usage report for the run summary"""
+        return (f"{len(self.calls)} calls, {self.input_tokens} in / {self.output_tokens} out tokens, "
+                f"~${self.cost:.3f}, {sum(c['latency'] for c in self.calls):.1f}s in Claude calls")
@@ -0,0 +1,91 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+
+
+# Verified HTML/CSS reused across runs (COMPONENT_MEMO=0 disables)
+COMPONENT_MEMO = os.getenv("COMPONENT_MEMO", "1") != "0"
+COMPONENT_MEMO_SIZE = int(os.getenv("COMPONENT_MEMO_SIZE", "256"))
+
+# Spec values that show up verbatim in generated HTML/CSS; stored as slots so a hit
+# for a differently written title ("beach run" vs "Beach Run") shows this game's text
+_SLOTS = ("title", "theme")
+_COUNT_SLOT = "{{collectible_count}}"
+
+
+def _normalize(value):
+    """Case/whitespace-insensitive form of a prompt input"""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    return " ".join(str(value).split()).lower()
+
+
+def _slot(name):
+    return "{{" + name + "}}"
+
+
+def to_template(text, spec):
+    """Replace this game's title/theme/collectible count with slots"""
+    ids = " ".join(spec.get('contracts', {}).values()).lower()
+    for name in _SLOTS:
+        value = spec.get(name)
+        # A title like "Score" must not turn id="score" into a slot
+        if value and len(value) > 3 and value.lower() not in ids:
+            text = text.replace(value, _slot(name))
+    count = len(spec.get('collectibles', []))
+    return text.replace(f"0/{count}", f"0/{_COUNT_SLOT}")
+
+
+def fill_template(template, spec):
+    """Inverse of to_template for another spec"""
+    for name in _SLOTS:
+        template = template.replace(_slot(name), str(spec.get(name, "")))
+    return template.replace(_COUNT_SLOT, str(len(spec.get('collectibles', []))))
+
+
+class ComponentMemo:
+    """
+    Size-bounded LRU of verified components, keyed on the normalized inputs that
+    shape them (title, theme, collectible count, contracts, prompt id and the API
+    key's fingerprint, see ImageToGameGenerator._memo_key). Only verified components
+    are stored.
+    """
+
+    def __init__(self, max_entries=COMPONENT_MEMO_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind, **inputs):
+        payload = json.dumps({"kind": kind, "inputs": _normalize(inputs)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key, spec):
+        """Component filled in for this spec, or None"""
+        with self._lock:
+            template = self._entries.get(key)
+            if template is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return fill_template(template, spec)
+
+    def put(self, key, component, spec):
+        """Remember a component that passed verification"""
+        with self._lock:
+            self._entries[key] = to_template(component, spec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+component_memo = ComponentMemo()
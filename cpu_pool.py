@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# "thread"  - thread pool; PIL releases the GIL while decoding, resizing and encoding
+# "process" - separate worker processes, no GIL contention with the Gradio workers.
+#             Workers re-import the main script as __mp_main__, so only use it when
+#             that script is a thin launcher: under `python app.py` every worker would
+#             import Gradio and build the whole UI (~5s and ~60MB per worker).
+# "inline"  - run on the calling thread (old behaviour)
+CPU_POOL_MODE = os.getenv("CPU_POOL_MODE", "thread")
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+# forkserver avoids forking the threaded Gradio server
+CPU_POOL_START_METHOD = os.getenv(
+    "CPU_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_executor():
+    """Create the shared CPU pool on first use"""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if CPU_POOL_MODE == "process":
+                    context = multiprocessing.get_context(CPU_POOL_START_METHOD)
+                    if CPU_POOL_START_METHOD == "forkserver":
+                        context.set_forkserver_preload(["scene_layout", "image_pipeline"])
+                    _executor = ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS, mp_context=context)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=CPU_POOL_WORKERS, thread_name_prefix="cpu")
+                logger.info("CPU pool started (%s, %d workers)", CPU_POOL_MODE, CPU_POOL_WORKERS)
+    return _executor
+
+
+def warm():
+    """Start the pool and its workers now, so the first upload doesn't pay for it"""
+    if CPU_POOL_MODE == "inline":
+        return
+    executor = get_executor()
+    # One trivial task per worker; process workers also import image_pipeline here
+    list(executor.map(_warm_worker, range(CPU_POOL_WORKERS)))
+
+
+def _warm_worker(_):
+    import image_pipeline  # noqa: F401
+
+
+def run_cpu(fn, *args, **kwargs):
+    """
+    Run a CPU-bound task in the shared pool and wait for the result.
+    fn must be a module-level function. Pass file paths rather than raw bytes
+    so the worker reads the data itself instead of it being pickled across.
+    """
+    if CPU_POOL_MODE == "inline":
+        return fn(*args, **kwargs)
+    return get_executor().submit(fn, *args, **kwargs).result()
+
+
+def shutdown():
+    """Stop the pool (used by benchmarks and tests)"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,25 @@
+def escape_srcdoc(text):
+    # Inside a double-quoted attribute only & and " need escaping; html.escape also
+    # rewrites every < > and ' in the game's code, which adds ~10% to the payload.
+    # str.replace returns the same object when nothing matches, so base64 isn't copied.
+    return text.replace("&", "&amp;").replace('"', "&quot;")
+
+
+def srcdoc_iframe(document):
+    """
+    Escape the game document so it can live safely inside srcdoc="" and wrap it in an iframe.
+    document is a string or a list of parts (see assemble_game); the parts are escaped
+    one by one and joined once, so the background image is copied only into the result.
+    """
+    parts = [document] if isinstance(document, str) else document
+
+    # IMPORTANT: allow-scripts so the JS runs
+    head = """
+            <iframe
+            srcdoc=\""""
+    tail = """"
+            style="width: 100%; max-width: 920px; height: 1024px; border: 0; border-radius: 12px;"
+            sandbox="allow-scripts allow-same-origin"
+            ></iframe>
+            """
+    return "".join([head, *map(escape_srcdoc, parts), tail])
@@ -1,170 +1,476 @@
-from anthropic import Anthropic
-import base64
 from urllib.parse import quote
-from PIL import Image
-import io
+import os
+from image_pipeline import prepare_renditions
+from game_document import srcdoc_iframe
+from cpu_pool import run_cpu
+from artifact_store import ArtifactStore, ARTIFACT_DIR
+from budget import BudgetAccountant, BudgetExceeded, key_fingerprint
+from run_context import RunContext, GenerationCancelled
+from hedging import hedged, hedge_delay, HEDGE_CANDIDATES, HEDGE_STAGES
+from model_router import ModelRouter
+from component_memo import component_memo, COMPONENT_MEMO
+from image_index import scene_index, PHASH_INDEX
+from spatial_grid import SpatialGrid, SCREEN, world_of, reachable_map, can_reach
+from game_runtime import world_runtime_js, perf_runtime_js
+from template_game import template_spec, TEMPLATE_HTML, TEMPLATE_CSS, TEMPLATE_JS
+from progress import analysis_event, status_event, spec_event, result_event, error_event, placeholder_html
+from prompts import prompts
+from minifier import minify_html, minify_css, minify_js, MINIFY_OUTPUT
+from log_setup import with_run_id, new_run_id
+import copy
 import json
+import logging
+import re
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# The JS components use this as the background's src; assemble_game puts the image there,
+# so until then a run holds the base64 once (the 'display' rendition) instead of in every JS copy
+IMAGE_PLACEHOLDER = 'PLACEHOLDER_IMAGE_DATA'
+_INLINE_IMAGE = re.compile(r"(bgImage\.src\s*=\s*)['\"]data:image/[a-z]+;base64,[^'\"]*['\"]")
+
+# Structured output for the combined analysis + design call (forced tool use)
+_RECT = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "x": {"type": "number"},
+        "y": {"type": "number"},
+        "width": {"type": "number"},
+        "height": {"type": "number"},
+        "color": {"type": "string"}
+    },
+    "required": ["name", "x", "y", "width", "height"]
+}
+
+GAME_DESIGN_TOOL = {
+    "name": "submit_game_design",
+    "description": "Submit the image analysis and the game specification designed from it.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "analysis": {
+                "type": "string",
+                "description": "Scene type, main objects, collectibles, goal, game theme and player start, as plain text"
+            },
+            "spec": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "theme": {"type": "string"},
+                    "contracts": {
+                        "type": "object",
+                        "properties": {
+                            "canvas_id": {"type": "string"},
+                            "score_id": {"type": "string"},
+                            "timer_id": {"type": "string"},
+                            "container_id": {"type": "string"}
+                        },
+                        "required": ["canvas_id", "score_id", "timer_id", "container_id"]
+                    },
+                    "player": {
+                        "type": "object",
+                        "properties": {
+                            "startX": {"type": "number"},
+                            "startY": {"type": "number"},
+                            "size": {"type": "number"},
+                            "speed": {"type": "number"}
+                        },
+                        "required": ["startX", "startY", "size", "speed"]
+                    },
+                    "obstacles": {"type": "array", "items": _RECT},
+                    "collectibles": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "x": {"type": "number"},
+                                "y": {"type": "number"},
+                                "size": {"type": "number"},
+                                "color": {"type": "string"}
+                            },
+                            "required": ["name", "x", "y", "size"]
+                        }
+                    },
+                    "goal": _RECT
+                },
+                "required": ["title", "theme", "contracts", "player", "obstacles", "collectibles", "goal"]
+            }
+        },
+        "required": ["analysis", "spec"]
+    }
+}
 
 
 class ImageToGameGenerator:
     """Handle simage analysis and game generation using Claude Vision"""
     
     def __init__(self, api_key: str):
+        # Imported here: the SDK takes ~1s to import and isn't needed until a run starts
+        from anthropic import Anthropic
         self.client = Anthropic(api_key=api_key)
-        self.model = "claude-sonnet-4-20250514"
+        # Model per stage (MODEL_ROUTES), with latency / pass-rate stats per stage and model
+        self.router = ModelRouter()
         self.max_repair_attempts = 2 
+        # Token/time budgets per run and per API key (reset at the start of each run)
+        self.key_id = key_fingerprint(api_key)
+        self.budget = BudgetAccountant(self.key_id)
+        # Image renditions: "JPEG" (optionally progressive) or "WEBP"
+        self.image_format = "JPEG"
+        self.progressive_jpeg = True
+        # "screen": one 800x600 level; "auto": panoramas become wider scrolling worlds
+        self.world_mode = os.getenv("WORLD_MODE", "screen")
+        # "sequential": analysis call, then spec call
+        # "combined": one vision call returns analysis + spec (saves a full round trip)
+        self.pipeline_mode = os.getenv("PIPELINE_MODE", "sequential")
+        # Finished games are saved for permalinks (set ARTIFACT_DIR="" to disable)
+        self.artifact_store = ArtifactStore(ARTIFACT_DIR) if ARTIFACT_DIR else None
+        # Cancellation/deadline for the current run (see bind_context)
+        self.context = None
+        # Hedged candidates run their calls under a child context of the run
+        self._local = threading.local()
+        # Best-of-N / backup calls for component stages (HEDGE_CANDIDATES=1 disables)
+        self.hedge_candidates = HEDGE_CANDIDATES
+        self.hedge_stages = HEDGE_STAGES
+        # Verified HTML/CSS reused across runs with the same contracts
+        self.component_memo = component_memo if COMPONENT_MEMO else None
+        # Analysis + spec of earlier uploads by perceptual hash (near-duplicates skip analysis)
+        self.scene_index = scene_index if PHASH_INDEX else None
+        # Whitespace/comment-minify the assembled game; sizes of the last assembly
+        self.minify_output = MINIFY_OUTPUT
+        self.payload = {}
+        # Prompt version per prompt name, over PROMPT_VERSIONS (see prompts.py)
+        self.prompt_versions = {}
+        # (stage, passed) for every verification this run, in order (first pass / repair counts)
+        self.verifications = []
+        
+    def _estimate_tokens(self, max_tokens, messages):
+        """Rough upper bound for a call: prompt text at ~4 chars/token, ~800 per image, plus max output"""
+        estimate = max_tokens
+        for message in messages:
+            content = message['content']
+            if isinstance(content, str):
+                estimate += len(content) // 4
+                continue
+            for block in content:
+                estimate += len(block.get('text', '')) // 4 if block['type'] == 'text' else 800
+        return estimate
+    
+    def _prompt(self, name):
+        """Prompt template for a stage: this generator's prompt_versions, else PROMPT_VERSIONS, else v1"""
+        return prompts.get(name, self.prompt_versions.get(name))
+    
+    def _create_message(self, stage, prompt=None, **kwargs):
+        """
+        Every Claude call goes through here so it is budget-checked and its usage recorded
+        prompt: the PromptTemplate the messages were rendered from, recorded with the call
+        """
+        if self.context is None:
+            self.bind_context(RunContext())
+        context = self._active_context()
+        context.check(stage)
+        self.budget.check(stage, self._estimate_tokens(kwargs['max_tokens'], kwargs['messages']))
+        kwargs.setdefault('timeout', context.timeout_for(stage))
+        
+        model = self.router.pick(stage)
+        # Remembered per thread so verification can be credited to the model (see _run_verified)
+        self._local.model = model
+        
+        start = time.perf_counter()
+        # Streamed so the socket is reachable and cancel() can abort the call mid-flight
+        with self.client.messages.stream(model=model, **kwargs) as stream:
+            abort = lambda sock=self._stream_socket(stream): self._abort_socket(sock)
+            # Runs right away if the context was cancelled before we got here
+            context.on_cancel(abort)
+            try:
+                context.check(stage)
+                response = stream.get_final_message()
+            except Exception as e:
+                if context.cancelled:
+                    raise GenerationCancelled(f"{stage} aborted: {context.reason}") from e
+                raise
+            finally:
+                context.remove_callback(abort)
+        latency = time.perf_counter() - start
+        self.router.stats.record_latency(stage, model, latency)
+        call = self.budget.record(stage, model, response, latency, prompt.id if prompt else None)
+        logger.info("%s call: %d in / %d out tokens, %.1fs", stage, call['input_tokens'], call['output_tokens'],
+                    call['latency'], extra={"stage": stage, "model": model, "prompt": call['prompt'],
+                                            "input_tokens": call['input_tokens'],
+                                            "output_tokens": call['output_tokens'], "latency": round(call['latency'], 3)})
+        return response
+    
+    def _stream_socket(self, stream):
+        """Underlying socket of a streamed response (None if the transport doesn't expose it)"""
+        try:
+            return stream.response.extensions["network_stream"].get_extra_info("socket")
+        except Exception:
+            return None
+    
+    def _abort_socket(self, sock):
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def _active_context(self):
+        """The run's context, or the hedged candidate's child context on a hedge thread"""
+        return getattr(self._local, 'context', None) or self.context
+    
+    def bind_context(self, context):
+        """Run under this RunContext: cancelling it aborts in-flight calls"""
+        self.context = context
+    
+    def cancel(self, reason="cancelled"):
+        """Abort in-flight Claude calls and make every later call raise GenerationCancelled"""
+        if self.context is None:
+            self.bind_context(RunContext())
+        self.context.cancel(reason)
+    
+    def _can_repair(self, stage, max_tokens):
+        """Repairs are optional - skip them when the run/key budget is running low"""
+        self.context.check(stage)
+        if self.budget.can_afford(max_tokens * 2):
+            return True
+        logger.warning("Skipping %s: %s", stage, self.budget.shortfall(max_tokens * 2))
+        return False
+    
+    def _memo_key(self, stage, spec):
+        """
+        The normalized prompt inputs that shape a component, scoped to this API key:
+        the model writes other text (a tagline, an item list) around title and theme,
+        so a component is only reused for the same game on the same key.
+        """
+        return self.component_memo.key(
+            stage, key=self.key_id, title=spec.get('title', ''), theme=spec.get('theme', ''),
+            collectible_count=len(spec.get('collectibles', [])), contracts=spec['contracts'],
+            prompt=self._prompt(stage).id
+        )
+    
+    def _memoized_component(self, stage, spec, generate, verify):
+        """Reuse a verified component made for the same prompt inputs, else _generate_component"""
+        if self.component_memo is not None:
+            key = self._memo_key(stage, spec)
+            cached = self.component_memo.get(key, spec)
+            if cached is not None:
+                issues = verify(cached)
+                if not issues:
+                    logger.info("%s: reusing verified component from memo", stage, extra={"stage": stage})
+                    return cached, issues
+                self.component_memo.discard(key)
+        return self._generate_component(stage, generate, verify)
+    
+    def _remember_component(self, stage, spec, component):
+        """Only called for components that passed verification"""
+        if self.component_memo is not None:
+            key = self._memo_key(stage, spec)
+            self.component_memo.put(key, component, spec)
+    
+    def _run_verified(self, stage, produce, verify):
+        """
+        produce() a component or repair, verify() it and credit the outcome to the
+        model that served the call. Returns (result, issues).
+        """
+        self._local.model = None
+        result = produce()
+        issues = verify(result)
+        self.verifications.append((stage, not issues))
+        if self._local.model is not None:
+            self.router.stats.record_verification(stage, self._local.model, not issues)
+        return result, issues
+    
+    def _generate_component(self, stage, generate, verify):
+        """
+        generate() one component and verify it: (result, issues). With hedging on for
+        this stage, several candidates race (at once, or a backup after the latency
+        percentile of the stage's model) and the first that passes wins; the rest are aborted.
+        """
+        if self.hedge_candidates <= 1 or stage not in self.hedge_stages:
+            return self._run_verified(stage, generate, verify)
+        
+        def run_candidate(context):
+            self._local.context = context
+            try:
+                return self._run_verified(stage, generate, verify)
+            finally:
+                self._local.context = None
+        
+        delay = hedge_delay(stage, self.router.pick(stage), self.router.stats)
+        return hedged(stage, run_candidate, lambda verified: verified[1], self.context,
+                      candidates=self.hedge_candidates, delay=delay)
         
     def encode_image(self, image_path): 
-        """Convert image to base64 and compress for Claude Vision API"""
+        """
+        Decode the image once and build base64 renditions:
+        'analysis' (small, for Claude Vision) and 'display' (800x600 game background)
+        """
         try:
-            print(f"Reading: {image_path}")
-            
-            img = Image.open(image_path)
+            logger.debug("Reading: %s", image_path)
             
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-                
-            # Resize image if too large
-            max_size = (1200, 900)
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                print(f"Resizing from {img.size} to fit within {max_size}")
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Save as JPEG with compression
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=75)
-            buffer.seek(0)
+            # Decode/resize/encode/base64 run in the CPU pool; only the path is handed over
+            images = run_cpu(
+                prepare_renditions,
+                image_path,
+                image_format=self.image_format,
+                progressive=self.progressive_jpeg,
+                world_mode=self.world_mode
+            )
             
-            encoded = base64.b64encode(buffer.read()).decode('utf-8')
-            print(f"Encoded: {len(encoded)} chars")
-            return encoded
+            for name in ('analysis', 'display'):
+                rendition = images[name]
+                logger.debug("Encoded %s: %dx%d, %d bytes, %d chars", name, rendition['width'], rendition['height'],
+                             rendition['bytes'], len(rendition['data']))
+            return images
         except Exception as e:
-            print(f"Error encoding image: {str(e)}")
+            logger.error("Error encoding image: %s", e)
             raise
     
-    def generate_game(self, image_path):
+    def generate_game(self, image_path, speculative=None, context=None):
         """
-        Main entry point to generate game from image
+        Main entry point to generate game from image, yields progress events (see progress.py)
+        speculative: optional job from SpeculativeAnalyzer.claim() - its
+        {'images', 'analysis', 'spec', 'calls'} result skips straight to the spec step
+        context: RunContext carrying the deadline and cancel flag (Stop button, tab closed)
+        Every log line of the run carries the same run_id.
         """
+        return with_run_id(self._generate_game(image_path, speculative, context), new_run_id())
+    
+    def _generate_game(self, image_path, speculative, context):
+        self.bind_context(context or RunContext())
         try: 
-            print("\n" + "="*50)
-            print("STARTING GAME GENERATION PIPELINE")
-            print("="*50)
+            logger.info("Starting game generation pipeline")
+            self.budget = BudgetAccountant(self.key_id)
+            self.verifications = []
+            
+            yield status_event("start", "Starting image analysis...", placeholder_html("Processing..."))
             
-            yield {
-                'analysis': 'Starting image analysis...',
-                'reflection': '',
-                'game_html': '<p style="text-align: center; padding: 40px;">Processing...</p>'
-           }
+            # Wait for the analysis started on upload (after the first yield, so the UI shows progress)
+            if speculative is not None:
+                # Stopping this run also stops the analysis it is waiting on
+                self.context.on_cancel(speculative.cancel)
+            prepared = speculative.result() if speculative is not None else None
+            self.context.check("analysis")
+            if prepared is not None:
+                self.budget.calls.extend(prepared['calls'])
              # Step 1: Analyze image 
             
-            analysis = self.analyze_image(image_path)
+            if prepared is not None:
+                logger.info("Using analysis prepared on upload")
+                images = prepared['images']
+                analysis, spec = prepared['analysis'], prepared['spec']
+            else:
+                # Decode once - both renditions are reused for the rest of the run
+                images = self.encode_image(image_path)
+                analysis, spec = self.analyze_scene(image_path, images)
+            # The Vision rendition's base64 isn't needed past analysis; the speculative
+            # job's dict may still be referenced, so drop it from a copy
+            images = {name: value for name, value in images.items() if name != 'analysis'}
             
+            yield analysis_event(analysis)
             if "Error" in analysis:
-                yield {
-                    'analysis': analysis,
-                    'reflection': '',
-                    'game_html': '<p style="color: red;">Analysis failed</p>'
-                }
+                yield error_event("Analysis failed", '<p style="color: red;">Analysis failed</p>')
                 return
             
-            yield {
-                'analysis': analysis,
-                'reflection': 'Step 1 complete!\nGenerating game specification...',
-                'game_html': '<p style="text-align: center; padding: 40px;">Designing game mechanics...</p>'
-            }
-           
-            spec = self.generate_game_spec(analysis)
+            if spec is None:
+                yield status_event("analysis", "Step 1 complete! Generating game specification...",
+                                   placeholder_html("Designing game mechanics..."))
+               
+                spec = self.generate_game_spec(analysis, images.get('layout'), images.get('world'))
+            self.context.check("spec")
             # Safety check - if spec is None, use default
             if spec is None:
-                print("Spec was None, using default")
+                logger.warning("Spec was None, using default")
                 spec = self._get_default_spec()
+            if images.get('world', SCREEN) != SCREEN:
+                spec['world'] = images['world']
             
             # Repair loop for collectible positions
-            for attempt in range(self.max_repair_attempts):
-                print(f"\nPosition Check - Attempt {attempt + 1}/{self.max_repair_attempts}")
-                
-                position_issues = self.verify_collectible_positions(spec)
-                
-                if not position_issues:
-                    print("All positions valid!")
+            position_issues = self.verify_collectible_positions(spec)
+            self.verifications.append(("spec", not position_issues))
+            for attempt in range(self.max_repair_attempts - 1):
+                if not position_issues or not self._can_repair("position repair", 1000):
                     break
-                
-                if attempt < self.max_repair_attempts - 1:
-                    print(f"Attempting repair...")
-                    spec = self.repair_collectible_positions(spec, position_issues)
-                else:
-                    print(f"Max repair attempts reached, continuing anyway...")
+                logger.info("Position repair - attempt %d/%d", attempt + 1, self.max_repair_attempts - 1)
+                spec, position_issues = self._run_verified(
+                    "repair_positions",
+                    lambda: self.repair_collectible_positions(spec, position_issues),
+                    self.verify_collectible_positions
+                )
+            logger.info("All positions valid" if not position_issues else "No more position repairs, continuing anyway")
+            if not position_issues:
+                self._index_scene(images, analysis, spec)
             
-            # Yield after spec completes
-            spec_preview = json.dumps(spec, indent=2)
-            position_status = "Verified" if not position_issues else f"⚠️ {len(position_issues)} issues remaining"
-            yield {
-                'analysis': analysis,
-                'reflection': f'Step 2 complete!\n\nGame Spec:\n{spec_preview}\n\nPosition Check: {len(position_status)} issues\n\nNext: Component generation...',
-                'game_html': f'<p style="text-align: center; padding: 40px;">Building {spec.get("title", "game")}...</p>'
-            }
+            # The spec is sent once; later events only say what changed
+            yield spec_event(spec, position_issues)
             
             # Step 3: Generate HTML with repair loop
-            html = self.generate_html_component(spec)
+            self.context.check("html")
+            verify_html = lambda html: self.verify_html_component(html, spec['contracts'])
+            html, html_issues = self._memoized_component(
+                "html", spec, lambda: self.generate_html_component(spec), verify_html
+            )
             
-            for attempt in range(self.max_repair_attempts):
-                html_issues = self.verify_html_component(html, spec['contracts'])
-                if not html_issues:
+            for attempt in range(self.max_repair_attempts - 1):
+                if not html_issues or not self._can_repair("HTML repair", 1000):
                     break
-                if attempt < self.max_repair_attempts - 1:
-                    html = self.repair_html_component(html, html_issues, spec)
+                html, html_issues = self._run_verified(
+                    "repair_html", lambda: self.repair_html_component(html, html_issues, spec), verify_html
+                )
+            if not html_issues:
+                self._remember_component("html", spec, html)
     
-            # Yield after HTML
-            html_status = "Passed" if not html_issues else f"{len(html_issues)} issues"
-            yield {
-                'analysis': analysis,
-                'reflection': f'HTML: {"✓" if not html_issues else f"⚠ {len(html_issues)}"}\n CSS...',
-                'game_html': f'<p style="text-align: center; padding: 40px; color: #00ff88;">HTML ready! ({len(html) if html else 0} chars)</p>'
-            }
+            yield status_event("html", f'HTML: {"✓" if not html_issues else f"⚠ {len(html_issues)}"}',
+                               placeholder_html(f"HTML ready! ({len(html) if html else 0} chars)", "#00ff88"))
             
             # Step 3b: CSS with repair loop
-            css = self.generate_css_component(spec, html)
+            self.context.check("css")
+            verify_css = lambda css: self.verify_css_component(css, spec['contracts'])
+            css, css_issues = self._memoized_component(
+                "css", spec, lambda: self.generate_css_component(spec, html), verify_css
+            )
            
-            for attempt in range(self.max_repair_attempts):
-                css_issues = self.verify_css_component(css, spec['contracts'])
-                if not css_issues:
+            for attempt in range(self.max_repair_attempts - 1):
+                if not css_issues or not self._can_repair("CSS repair", 1000):
                     break
-                if attempt < self.max_repair_attempts - 1:
-                    css = self.repair_css_component(css, css_issues, spec)
-            
-            yield {
-                'analysis': analysis,
-                'reflection': f'HTML: ✓\nCSS: {"✓" if not css_issues else f"⚠ {len(css_issues)}"}\nJS...',
-                'game_html': '<p style="text-align: center; padding: 40px;">Adding game logic...</p>'
-            }
+                css, css_issues = self._run_verified(
+                    "repair_css", lambda: self.repair_css_component(css, css_issues, spec), verify_css
+                )
+            if not css_issues:
+                self._remember_component("css", spec, css)
             
-            # Get image for JS
-            image_base64 = self.encode_image(image_path)
+            yield status_event("css", f'CSS: {"✓" if not css_issues else f"⚠ {len(css_issues)}"}',
+                               placeholder_html("Adding game logic..."))
             
             # Step 3c: JavaScript with repair loop
-            js = self.generate_js_component(spec, html, image_base64)
+            self.context.check("js")
+            verify_js = lambda js: self.verify_js_component(js, spec['contracts'])
+            js, js_issues = self._generate_component(
+                "js", lambda: self.generate_js_component(spec, html), verify_js
+            )
             
-            for attempt in range(self.max_repair_attempts):
-                js_issues = self.verify_js_component(js, spec['contracts'])
-                if not js_issues:
+            for attempt in range(self.max_repair_attempts - 1):
+                if not js_issues or not self._can_repair("JS repair", 3500):
                     break
-                if attempt < self.max_repair_attempts - 1:
-                    js = self.repair_js_component(js, js_issues, spec, image_base64)
+                js, js_issues = self._run_verified(
+                    "repair_js", lambda: self.repair_js_component(js, js_issues, spec), verify_js
+                )
 
-            yield {
-                'analysis': analysis,
-                'reflection': f'All components verified!\n\nHTML: ✓\nCSS: ✓\nJS: {"✓" if not js_issues else f"⚠ {len(js_issues)}"}\n\nAssembling...',
-                'game_html': '<p style="text-align: center; padding: 40px;">Assembling...</p>'
-            }
+            yield status_event("js", f'JS: {"✓" if not js_issues else f"⚠ {len(js_issues)}"}',
+                               placeholder_html("Assembling..."))
             
-            yield {
-                'analysis': analysis,
-                'reflection': f'All components generated!\n\nHTML: {len(html) if html else 0} chars\nCSS: {len(css) if css else 0} chars\nJS: {len(js) if js else 0} chars\n\nNext: Assembly',
-                'game_html': '<p style="text-align: center; padding: 40px; color: #00ff88;">Ready to assemble!</p>'
-            }
-            
-            game_html = self.assemble_game(html, css, js, spec)
+            self.context.check("assembly")
+            # Canvas-sized background, embedded in the document only at assembly
+            background = images['display']
+            document = self.assemble_game(html, css, js, spec, background)
+            game_id = self.save_game(document, spec, analysis, background, html, css, js)
+            game_html = self.embed_game(document, game_id)
             total_issues = len(html_issues) + len(css_issues) + len(js_issues)
 
             summary = f'''GENERATION COMPLETE! 🎉
@@ -174,182 +480,274 @@ class ImageToGameGenerator:
             - CSS: {len(css)} chars ({"✓" if not css_issues else f"⚠ {len(css_issues)} issues"})
             - JS: {len(js)} chars ({"✓" if not js_issues else f"⚠ {len(js_issues)} issues"})
 
-            Total: {len(game_html)} chars
+            Total: {self.payload['document']} chars
+            Payload: {self.payload_report(game_html, game_id)}
             Issues: {total_issues}
-
-            Game Spec:
-            {json.dumps(spec, indent=2)}
+            Permalink: {f"/games/{game_id}" if game_id else "not saved"}
+            Usage: {self.budget.summary()}
+            Models: {", ".join(f"{c['stage']}={c['model']}" for c in self.budget.calls)}
+            Prompts: {", ".join(dict.fromkeys(c['prompt'] for c in self.budget.calls if c.get('prompt')))}
 
             Use arrow keys (←↑↓→) to play!
             '''
         
-            yield {
-                'analysis': analysis,
-                'reflection': summary,
-                'game_html': game_html
-            }
+            yield result_event(game_html, summary)
             
-            print("\n" + "="*50)
-            print("PIPELINE COMPLETE!")
-            print("="*50)
+            logger.info("Pipeline complete")
+            logger.debug("Model stats:\n%s", self.router.stats.report())
+        except GeneratorExit:
+            # Gradio closed the generator: client disconnected or the event was cancelled
+            self.context.cancel("client disconnected")
+            raise
+        except GenerationCancelled as e:
+            logger.info("Generation stopped: %s", e)
+            if self.context.timed_out:
+                yield error_event(f"Generation timed out. Stopped: {e}",
+                                  '<p style="color: red;">Generation took too long and was stopped. Please try again.</p>')
         except Exception as e:
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
-            yield {
-                'analysis': f'Error: {e}',
-                'reflection': '',
-                'game_html': f'<p style="color: red;">Error: {e}</p>'
-            }
+            logger.exception("Generation failed: %s", e)
+            yield error_event(f"Error: {e}", f'<p style="color: red;">Error: {e}</p>')
+        finally:
+            self.context.close()
                  
-    def analyze_image(self, image_path):  
+    def generate_template_game(self, image_path, context=None, reason="the server is busy"):
         """
-        Step 1: Analyze image with Claude Vision
-        Identifies objects, spaces and potential game elements
+        Degraded mode: a template game over the uploaded image, no Claude calls.
+        The level comes from the layout measured locally from the image (see template_game).
+        Yields the same progress events as generate_game.
         """
-        print("\nSTEP 1: Analyzing Image")
-        print("-" * 50)
-        image_data = self.encode_image(image_path)
-        
-        prompt = """Analyze this image for creating a 2D browser game.
+        return with_run_id(self._generate_template_game(image_path, context, reason), new_run_id())
 
-        Provide:
+    def _generate_template_game(self, image_path, context, reason):
+        self.bind_context(context or RunContext())
+        try:
+            logger.info("Starting template game (%s)", reason)
+            self.budget = BudgetAccountant(self.key_id)
+            yield status_event("template", f"High demand: {reason}. Building a quick template game instead "
+                               "(no API credits used)...", placeholder_html("Building a quick game..."))
 
-        1. **SCENE TYPE**: What kind of scene is this? (living room, kitchen, office, outdoor, etc.)
+            images = self.encode_image(image_path)
+            self.context.check("assembly")
+            spec = template_spec(images.get('layout'), images.get('world'))
+            # Drop gems the measured obstacles cover or cut off from the start
+            issues = self.verify_collectible_positions(spec)
+            flagged = {issue.split(" at ")[0] for issue in issues}
+            spec['collectibles'] = [c for c in spec['collectibles'] if c['name'] not in flagged]
+            yield spec_event(spec, [])
 
-        2. **MAIN OBJECTS** (3-5 obstacles):
-        - Name, position (left/center/right, top/middle/bottom), size (small/medium/large)
+            background = images['display']
+            document = self.assemble_game(TEMPLATE_HTML, TEMPLATE_CSS, TEMPLATE_JS, spec, background)
+            game_id = self.save_game(document, spec, "Template game (degraded mode)", background,
+                                     TEMPLATE_HTML, TEMPLATE_CSS, TEMPLATE_JS)
+            game_html = self.embed_game(document, game_id)
 
-        3. **COLLECTIBLES** (3-5 small items):
-        - Name, position
+            summary = f'''QUICK GAME READY! ⚡
 
-        4. **GOAL**: What would be a natural winning destination?
+            The server is under heavy load ({reason}), so this is a template game
+            built from the layout of your photo, with no Claude calls.
+            Try Generate again later for a game written for your image.
 
-        5. **GAME THEME**: What kind of game fits this scene?
-        - Kitchen → cooking/ingredient collection
-        - Beach → surfing/shell collecting
-        - Living room → treasure hunt
-        - Be creative!
+            Collectibles: {len(spec['collectibles'])}, obstacles: {len(spec['obstacles'])}
+            Payload: {self.payload_report(game_html, game_id)}
+            Permalink: {f"/games/{game_id}" if game_id else "not saved"}
 
-        6. **PLAYER START**: Best starting position
+            Use arrow keys (←↑↓→) to play!
+            '''
+            yield result_event(game_html, summary)
+            logger.info("Template game complete")
+        except GeneratorExit:
+            self.context.cancel("client disconnected")
+            raise
+        except GenerationCancelled as e:
+            logger.info("Template game stopped: %s", e)
+        except Exception as e:
+            logger.exception("Template game failed: %s", e)
+            yield error_event(f"Error: {e}", f'<p style="color: red;">Error: {e}</p>')
+        finally:
+            self.context.close()
 
-        Be specific with positions and creative with theme!"""
+    def analyze_scene(self, image_path, images):
+        """
+        Analysis (and in combined mode the spec) for an encoded image: (analysis, spec).
+        Near-duplicates of an earlier upload with the same API key reuse its analysis and verified spec.
+        """
+        if self.scene_index is not None:
+            match = self.scene_index.lookup(images['phash'], scope=self.key_id)
+            if match is not None:
+                distance, scene = match
+                logger.info("Near-duplicate of an earlier upload (%d bits apart), reusing its analysis", distance)
+                return scene['analysis'], copy.deepcopy(scene['spec'])
+        
+        if self.pipeline_mode == "combined":
+            return self.analyze_and_design(image_path, images)
+        return self.analyze_image(image_path, images), None
+    
+    def _index_scene(self, images, analysis, spec):
+        """Remember a successful analysis + position-verified spec for near-duplicate uploads"""
+        if self.scene_index is not None:
+            self.scene_index.add(images['phash'], {'analysis': analysis, 'spec': copy.deepcopy(spec)},
+                                 scope=self.key_id)
+    
+    def analyze_image(self, image_path, images=None):  
+        """
+        Step 1: Analyze image with Claude Vision
+        Identifies objects, spaces and potential game elements
+        """
+        logger.debug("Step 1: analyzing image")
+        if images is None:
+            images = self.encode_image(image_path)
+        rendition = images['analysis']
+        
+        prompt = self._prompt("analysis")
+        text = prompt.render()
         
         try:
-            print("\nCalling Claude Vision for image analysis...")
-            response = self.client.messages.create(
-                model=self.model,
+            logger.debug("Calling Claude Vision for image analysis")
+            response = self._create_message(
+                "analysis",
+                prompt=prompt,
                 max_tokens=2000,
                 messages=[{
                     "role": "user",
                     "content": [
                         {"type": "image",
-                        "source": {"type": "base64", "media_type": "image/jpeg", "data": image_data}},
-                        {"type": "text", "text": prompt},
+                        "source": {"type": "base64", "media_type": rendition['media_type'], "data": rendition['data']}},
+                        {"type": "text", "text": text},
                     ],
                 }],
             )
             analysis = response.content[0].text
-            print(f"Analysis complete ({len(analysis)} chars)")
+            logger.info("Analysis complete (%d chars)", len(analysis))
             return analysis
+        except (BudgetExceeded, GenerationCancelled):
+            # Required step - let generate_game report the budget/cancellation
+            raise
         except Exception as e:
             error_msg = f"Error analyzing image: {str(e)}"
-            print(f"{error_msg}")
+            logger.error(error_msg)
             return error_msg
         
-    def generate_game_spec(self, analysis):
+    def analyze_and_design(self, image_path, images=None):
+        """
+        Steps 1+2 in a single vision call: returns (analysis, spec).
+        Claude fills the submit_game_design tool, so the spec comes back as structured JSON.
+        spec is None if the call didn't produce one (caller falls back to generate_game_spec).
+        """
+        logger.debug("Step 1+2: analyzing image and designing game")
+        if images is None:
+            images = self.encode_image(image_path)
+        rendition = images['analysis']
+        
+        prompt = self._prompt("design")
+        text = prompt.render(layout=self._layout_prompt(images.get('layout'), images.get('world')))
+        
+        try:
+            logger.debug("Calling Claude Vision for analysis + game design")
+            response = self._create_message(
+                "design",
+                prompt=prompt,
+                max_tokens=4000,
+                tools=[GAME_DESIGN_TOOL],
+                tool_choice={"type": "tool", "name": GAME_DESIGN_TOOL["name"]},
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {"type": "image",
+                        "source": {"type": "base64", "media_type": rendition['media_type'], "data": rendition['data']}},
+                        {"type": "text", "text": text},
+                    ],
+                }],
+            )
+            
+            design = next((block.input for block in response.content if block.type == "tool_use"), None)
+            if not design or not design.get('analysis'):
+                raise ValueError("no game design returned")
+            
+            analysis = design['analysis']
+            spec = design.get('spec')
+            if not isinstance(spec, dict) or not spec.get('collectibles'):
+                logger.warning("Combined call returned no usable spec, falling back to spec call")
+                spec = None
+            else:
+                spec['contracts'] = self._get_default_spec()['contracts']
+                logger.info("Analysis (%d chars) and spec generated: %s", len(analysis), spec.get('title', 'Untitled'))
+            return analysis, spec
+        except (BudgetExceeded, GenerationCancelled):
+            # Required step - let generate_game report the budget/cancellation
+            raise
+        except Exception as e:
+            error_msg = f"Error analyzing image: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, None
+        
+    def _screens(self, world):
+        """How many 800x600 screens a level covers"""
+        world = world or SCREEN
+        return max(1, round(world['width'] * world['height'] / (SCREEN['width'] * SCREEN['height'])))
+    
+    def _layout_prompt(self, layout, world=None):
+        """
+        Prompt section with the level size and the rectangles measured locally
+        from the image (see scene_layout)
+        """
+        section = ""
+        if world and world != SCREEN:
+            section += self._prompt("large_world").render(
+                width=world['width'], height=world['height'],
+                obstacle_count=5 * self._screens(world), collectible_count=4 * self._screens(world)
+            )
+        if not layout or not (layout.get('obstacles') or layout.get('free')):
+            return section
+        return section + self._prompt("detected_layout").render(
+            obstacles=json.dumps(layout.get('obstacles', [])), free=json.dumps(layout.get('free', []))
+        )
+    
+    def generate_game_spec(self, analysis, layout=None, world=None):
       """
       Step 2: Generate game specification with contracts
+      layout: obstacle / free-space rectangles from encode_image, so positions
+      come from the image rather than from words like "left, large"
+      world: level size for scrolling worlds (None: one 800x600 screen)
       """
-      print("\nSTEP 2: Generating Game Spec")
-      print("-" * 50)  
-      
-      prompt = f"""Based on this image analysis, create a game specification in JSON format.
-      ANALYSIS:
-        {analysis}
-    
-      CRITICAL POSITIONING RULES:
-        1. Collectibles must NOT be placed inside obstacle rectangles
-        2. Collectibles should be at least 20 pixels away from obstacle edges
-        3. Collectibles must be reachable by the player
-        4. Check each collectible position against all obstacles before assigning
-      
-      Generate a JSON spec with this exact structure:
+      logger.debug("Step 2: generating game spec")
       
-      {{
-        "title": "Creative game title",
-        "theme": "Brief theme description",
-        "contracts": {{
-            "canvas_id": "gameCanvas",
-            "score_id": "score",
-            "timer_id": "timer",
-            "container_id": "gameContainer"
-        }},
-        "player": {{
-            "startX": 50,
-            "startY": 500,
-            "size": 25,
-            "speed": 4
-        }},
-        "obstacles": [
-            {{"name": "Object name", "x": 200, "y": 300, "width": 150, "height": 100, "color": "#8B4513"}}
-        ],
-        "collectibles": [
-            {{"name": "Item name", "x": 400, "y": 200, "size": 15, "color": "#FFD700"}}
-        ],
-        "goal": {{
-            "name": "Goal description",
-            "x": 700,
-            "y": 50,
-            "width": 80,
-            "height": 60
-        }}
-     }}
-
-        COORDINATE SYSTEM:
-        - Canvas is 800x600 pixels
-        - Origin (0,0) is top-left
-        - Positions: left(50-200), center(300-500), right(600-750)
-        - Vertical: top(50-200), middle(250-400), bottom(450-550)
-
-        COLORS:
-        - Use realistic colors: brown for furniture, green for plants, gold for collectibles
-        - Make goal stand out with bright color
-
-        Return ONLY valid JSON, no explanations."""
+      prompt = self._prompt("spec")
+      text = prompt.render(analysis=analysis, layout=self._layout_prompt(layout, world))
       
       try:
-          print("\nCalling Claude to design game...")
-          response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
+          logger.debug("Calling Claude to design game")
+          response = self._create_message(
+            "spec",
+            prompt=prompt,
+            # Bigger worlds list more obstacles and collectibles
+            max_tokens=min(8000, 2000 * self._screens(world)),
+            messages=[{"role": "user", "content": text}]
            )
         
           json_text = response.content[0].text
         
-          print(f"📄 Response length: {len(json_text)} chars")
-          print(f"📄 First 100 chars: {json_text[:100]}")
+          logger.debug("Spec response: %d chars, starts %r", len(json_text), json_text[:100])
           # Clean markdown if present
           if "```json" in json_text:
-            print("🧹 Cleaning JSON markdown")
+            logger.debug("Stripping ```json fence")
             json_text = json_text.split("```json")[1].split("```")[0].strip()
           elif "```" in json_text:
-            print("🧹 Cleaning generic markdown")
+            logger.debug("Stripping ``` fence")
             json_text = json_text.split("```")[1].split("```")[0].strip()
     
-          print(f"🔍 Parsing JSON ({len(json_text)} chars)...")
           spec = json.loads(json_text)
-          print(f"Spec generated: {spec.get('title', 'Untitled')}")
+          logger.info("Spec generated: %s", spec.get('title', 'Untitled'))
           return spec
       except json.JSONDecodeError as e:
-            print(f"JSON parsing failed: {e}")
-            print(f"Raw response: {json_text[:200]}...")
+            logger.error("Spec JSON parsing failed: %s; response starts %r", e, json_text[:200])
             return self._get_default_spec()    
       
+      except (BudgetExceeded, GenerationCancelled):
+            # Required step - let generate_game report the budget/cancellation
+            raise
       except Exception as e:
             error_msg = f"Error generating game spec: {str(e)}"
-            print(f"{error_msg}")
+            logger.error(error_msg)
             return {"error": error_msg}
         
     def _get_default_spec(self):
@@ -376,39 +774,22 @@ class ImageToGameGenerator:
     def generate_html_component(self, spec):
         """Step 3a: Generate HTML component"""
         
-        print("\nSTEP 3A: Generating HTML Component")
-        print("-" * 50)
+        logger.debug("Step 3a: generating HTML component")
         
         contracts = spec['contracts']
         
-        prompt = f"""Generate the HTML body structure for this game.
-
-        GAME SPEC:
-        Title: {spec['title']}
-        Theme: {spec['theme']}
-
-        REQUIRED ELEMENTS WITH THESE EXACT IDs:
-        - Container: id="{contracts['container_id']}"
-        - Canvas: id="{contracts['canvas_id']}" (must be 800x600)
-        - Score display: id="{contracts['score_id']}"
-        - Timer display: id="{contracts['timer_id']}"
-
-        REQUIREMENTS:
-        - Clean, semantic HTML
-        - Title should be: {spec['title']}
-        - Add brief instructions
-        - Show score as "Score: X/{len(spec['collectibles'])}"
-
-        Return ONLY the HTML body content (no <!DOCTYPE>, <html>, <head>, or <style>).
-        Start with <div id="{contracts['container_id']}"> and end with </div>."""
+        prompt = self._prompt("html")
+        text = prompt.render(title=spec['title'], theme=spec['theme'], collectible_count=len(spec['collectibles']),
+                             **contracts)
 
         try:
-            print("Calling Claude to generate HTML...")
+            logger.debug("Calling Claude to generate HTML")
             
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "html",
+                prompt=prompt,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             html = response.content[0].text
@@ -419,18 +800,20 @@ class ImageToGameGenerator:
             elif "```" in html:
                 html = html.split("```")[1].split("```")[0].strip()
             
-            print(f"HTML generated ({len(html)} chars)")
+            logger.info("HTML generated (%d chars)", len(html))
             return html
             
+        except (BudgetExceeded, GenerationCancelled):
+            # Required step - let generate_game report the budget/cancellation
+            raise
         except Exception as e:
-            print(f"HTML generation failed: {e}")
+            logger.error("HTML generation failed: %s", e)
             return None
 
     def verify_html_component(self, html, contracts):
         """Verify HTML has required elements"""
         
-        print("\nVerifying HTML Component")
-        print("-" * 50)
+        logger.debug("Verifying HTML component")
         
         issues = []
         
@@ -449,61 +832,44 @@ class ImageToGameGenerator:
         for id_name, description in required_ids:
             if f'id="{id_name}"' not in html and f"id='{id_name}'" not in html:
                 issues.append(f"Missing required id: {id_name} ({description})")
-                print(f"Missing: {id_name}")
+                logger.debug("Missing: %s", id_name)
             else:
-                print(f"Found: {id_name}")
+                logger.debug("Found: %s", id_name)
         
         # Check canvas dimensions
         if '<canvas' in html:
             if 'width="800"' not in html or 'height="600"' not in html:
                 issues.append("Canvas missing correct dimensions (800x600)")
-                print("Canvas dimensions incorrect")
+                logger.debug("Canvas dimensions incorrect")
             else:
-                print("Canvas dimensions correct")
+                logger.debug("Canvas dimensions correct")
         else:
             issues.append("No canvas element found")
-            print("No canvas element")
+            logger.debug("No canvas element")
         
         if not issues:
-            print("HTML verification passed!")
+            logger.info("HTML verification passed")
         
         return issues
   
     def generate_css_component(self, spec, html):
         """Step 3b: Generate CSS component"""
     
-        print("\nSTEP 3B: Generating CSS Component")
-        print("-" * 50)
+        logger.debug("Step 3b: generating CSS component")
         
         contracts = spec['contracts']
         
-        prompt = f"""Generate CSS for this game.
-
-        GAME TITLE: {spec['title']}
-
-        HTML IDs TO STYLE:
-        - #{contracts['container_id']}
-        - #{contracts['canvas_id']}
-        - #{contracts['score_id']}
-        - #{contracts['timer_id']}
-
-        REQUIREMENTS:
-        - Dark theme: background #1a1a1a
-        - Green accents: #00ff88
-        - Canvas: 3px solid #00ff88 border, rounded corners
-        - Centered layout
-        - Good typography
-        - Responsive spacing
-
-        Return ONLY the CSS (no <style> tags, just the CSS rules)."""
+        prompt = self._prompt("css")
+        text = prompt.render(title=spec['title'], **contracts)
 
         try:
-            print("Calling Claude to generate CSS...")
+            logger.debug("Calling Claude to generate CSS")
             
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "css",
+                prompt=prompt,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             css = response.content[0].text
@@ -514,18 +880,20 @@ class ImageToGameGenerator:
             elif "```" in css:
                 css = css.split("```")[1].split("```")[0].strip()
             
-            print(f"CSS generated ({len(css)} chars)")
+            logger.info("CSS generated (%d chars)", len(css))
             return css
             
+        except (BudgetExceeded, GenerationCancelled):
+            # Required step - let generate_game report the budget/cancellation
+            raise
         except Exception as e:
-            print(f"CSS generation failed: {e}")
+            logger.error("CSS generation failed: %s", e)
             return None
 
     def verify_css_component(self, css, contracts):
         """Verify CSS component"""
         
-        print("\nVerifying CSS Component")
-        print("-" * 50)
+        logger.debug("Verifying CSS component")
         
         issues = []
         
@@ -542,92 +910,54 @@ class ImageToGameGenerator:
         for selector, description in required_selectors:
             if selector not in css:
                 issues.append(f"Missing CSS for: {selector} ({description})")
-                print(f"Missing: {selector}")
+                logger.debug("Missing: %s", selector)
             else:
-                print(f"Found: {selector}")
+                logger.debug("Found: %s", selector)
         
         # Check braces balanced
         if css.count('{') != css.count('}'):
             issues.append("Unbalanced braces in CSS")
-            print("Unbalanced braces")
+            logger.debug("Unbalanced braces")
         else:
-            print("Braces balanced")
+            logger.debug("Braces balanced")
         
         if not issues:
-            print("CSS verification passed!")
+            logger.info("CSS verification passed")
         
         return issues
 
-    def generate_js_component(self, spec, html, image_base64):
+    def generate_js_component(self, spec, html):
         """Step 3c: Generate JavaScript component"""
         
-        print("\nSTEP 3C: Generating JavaScript Component")
-        print("-" * 50)
+        logger.debug("Step 3c: generating JavaScript component")
         
         contracts = spec['contracts']
         
-        prompt = f"""Generate JavaScript game logic for this browser game.
-
-        GAME SPEC:
-        {json.dumps(spec, indent=2)}
-
-        REQUIRED DOM ELEMENTS (from HTML):
-        - Canvas: document.getElementById('{contracts['canvas_id']}')
-        - Score: document.getElementById('{contracts['score_id']}')
-        - Timer: document.getElementById('{contracts['timer_id']}')
-
-        REQUIREMENTS:
-        1. Get canvas context: const ctx = canvas.getContext('2d')
-        2. Load background image: - USE THIS EXACT PLACEHOLDER:
-           const bgImage = new Image();
-           bgImage.onload = () => {{ console.log('Image loaded'); startGame(); }};
-           bgImage.onerror = () => {{ console.warn('Image failed'); startGame(); }};
-           bgImage.src = 'PLACEHOLDER_IMAGE_DATA';
-        3. Arrow key controls (←↑↓→)
-        4. Player moves at speed from spec
-        5. Collision detection with obstacles from spec
-        6. Collect items from spec
-        7. Win when all items collected + reach goal
-        8. Update score and timer displays
-        9. Game loop with requestAnimationFrame
-        10. Required functions: startGame(), gameLoop(), draw()
-        11. Game should finish in 2 minute
-        12. When an item is collected, the item collected name should briefly appear at the top of the canvas for 3 seconds.
-        13. The obstacles should be drawn as filled rectangles with dark black border using their specified colors from the spec. but keep the rectangle as translucent as possible and name of the obstacle written in a smaller font inside the obstacle.
-        14. CRITICAL - START GAME IMMEDIATELY:
-            At the very end of the script, call startGame() immediately:
-            
-            // Start game when DOM is ready
-            if (document.readyState === 'loading') {{
-                document.addEventListener('DOMContentLoaded', startGame);
-            }} else {{
-                startGame();
-            }}
-        15. CRITICAL: Use EXACTLY the text 'PLACEHOLDER_IMAGE_DATA' for the image src.
-            Do NOT generate any base64 data yourself.
-        16. CRITICAL DRAWING ORDER in draw() function:
-                a) Clear canvas
-                b) Draw background image (if loaded)
-                c) Draw obstacles
-                d) Draw collectibles  
-                e) Draw goal
-                f) Draw player LAST (so it's always on top!)
-                
-            Make player VERY VISIBLE:
-            - Player color: bright pink/red (#FF1493 or #FF69B4)
-            - Player size: 25x25 pixels
-            - Draw player as filled rectangle or circle
-            - Add black border around player (lineWidth: 2)    
-            Return ONLY JavaScript code (no <script> tags).
-            Use the exact obstacle and collectible positions from the spec."""
+        # Large worlds: the level is in GameWorld at runtime (see game_runtime), so the
+        # prompt and the generated code don't grow with the number of obstacles
+        world = spec.get('world')
+        prompt_spec = spec
+        world_rules = ""
+        if world:
+            prompt_spec = dict(
+                spec,
+                obstacles=f"{len(spec['obstacles'])} obstacles - use GameWorld.obstacles",
+                collectibles=f"{len(spec['collectibles'])} collectibles - use GameWorld.collectibles",
+            )
+            world_rules = self._prompt("js_world").render(width=world['width'], height=world['height'])
+        
+        prompt = self._prompt("js")
+        text = prompt.render(spec=json.dumps(prompt_spec, indent=2), spec_compact=json.dumps(prompt_spec, separators=(",", ":")),
+                             world_rules=world_rules, **contracts)
 
         try:
-                print("Calling Claude to generate JavaScript...")
+                logger.debug("Calling Claude to generate JavaScript")
                 
-                response = self.client.messages.create(
-                    model=self.model,
+                response = self._create_message(
+                    "js",
+                    prompt=prompt,
                     max_tokens=3500,  # JS is bigger
-                    messages=[{"role": "user", "content": prompt}]
+                    messages=[{"role": "user", "content": text}]
                 )
                 
                 js = response.content[0].text
@@ -640,42 +970,39 @@ class ImageToGameGenerator:
                 elif "```" in js:
                     js = js.split("```")[1].split("```")[0].strip()
                 
-                      # CRITICAL: Replace placeholder with actual base64
-                print(f"Checking for placeholder...")
-                if 'PLACEHOLDER_IMAGE_DATA' in js:
-                    print("Found placeholder, injecting image...")
-                    js = js.replace('PLACEHOLDER_IMAGE_DATA', f'data:image/jpeg;base64,{image_base64}')
-                else:
-                    print("Placeholder not found! Trying fallback replacement...")
-                    # Fallback: look for any data:image/jpeg;base64, pattern and replace
-                    import re
-                    pattern = r"bgImage\.src\s*=\s*['\"]data:image/jpeg;base64,[^'\"]*['\"]"
-                    replacement = f"bgImage.src = 'data:image/jpeg;base64,{image_base64}'"
-                    js = re.sub(pattern, replacement, js)
+                # CRITICAL: keep the image placeholder, assemble_game puts the base64 there
+                js = self._image_placeholder(js)
                 
                 # FORCE START - add this at the end if not present
                 if 'startGame()' not in js.split('\n')[-10:]:  # Check last 10 lines
-                    print("Adding forced game start...")
+                    logger.debug("Adding forced game start")
                     js += "\n\n// Force start\nif (document.readyState === 'loading') {\n    document.addEventListener('DOMContentLoaded', startGame);\n} else {\n    startGame();\n}"
                 js += "\n\n// Debug logging\nconsole.log('✅ Script loaded');\nconsole.log('Canvas:', document.getElementById('" + contracts['canvas_id'] + "'));\nconsole.log('Starting in 100ms...');\nsetTimeout(() => { console.log('Calling startGame...'); startGame(); }, 100);"
-                print(f"JavaScript generated ({len(js)} chars)")
+                logger.info("JavaScript generated (%d chars)", len(js))
                         
-                  # Verify image is actually in there
-                if image_base64[:50] in js:
-                    print("Image data verified in JS")
-                else:
-                    print("WARNING: Image data might not be properly injected!")
                 return js
                         
+        except (BudgetExceeded, GenerationCancelled):
+                # Required step - let generate_game report the budget/cancellation
+                raise
         except Exception as e:
-                print(f"JavaScript generation failed: {e}")
+                logger.error("JavaScript generation failed: %s", e)
                 return None     
 
+    def _image_placeholder(self, js):
+        """The JS with 'PLACEHOLDER_IMAGE_DATA' as its image src, even if the model wrote a data: URI"""
+        if js is None or IMAGE_PLACEHOLDER in js:
+            return js
+        # Fallback: any inline data:image/...;base64, src goes back to the placeholder
+        js, count = _INLINE_IMAGE.subn(lambda m: f"{m.group(1)}'{IMAGE_PLACEHOLDER}'", js)
+        if not count:
+            logger.warning("Image placeholder not found, the game will have no background")
+        return js
+
     def verify_js_component(self, js, contracts):
         """Verify JavaScript component"""
         
-        print("\nVerifying JavaScript Component")
-        print("-" * 50)
+        logger.debug("Verifying JavaScript component")
         
         issues = []
         
@@ -689,9 +1016,9 @@ class ImageToGameGenerator:
         for func in required_functions:
             if f'function {func}' not in js and f'{func} =' not in js and f'const {func}' not in js:
                 issues.append(f"Missing function: {func}")
-                print(f"Missing: {func}()")
+                logger.debug("Missing: %s()", func)
             else:
-                print(f"Found: {func}()")
+                logger.debug("Found: %s()", func)
         
         # Check uses correct IDs
         required_ids = [contracts['canvas_id'], contracts['score_id'], contracts['timer_id']]
@@ -699,27 +1026,34 @@ class ImageToGameGenerator:
         for id_name in required_ids:
             if f"'{id_name}'" not in js and f'"{id_name}"' not in js:
                 issues.append(f"Doesn't use required ID: {id_name}")
-                print(f"Doesn't use: {id_name}")
+                logger.debug("Doesn't use: %s", id_name)
             else:
-                print(f"Uses: {id_name}")
+                logger.debug("Uses: %s", id_name)
         
         # Check for game loop
         if 'requestAnimationFrame' not in js:
             issues.append("Missing requestAnimationFrame")
-            print("No requestAnimationFrame")
+            logger.debug("No requestAnimationFrame")
         else:
-            print("Has requestAnimationFrame")
+            logger.debug("Has requestAnimationFrame")
         
         if not issues:
-            print("JavaScript verification passed!")
+            logger.info("JavaScript verification passed")
         
         return issues
     
-    def assemble_game(self, html_code, css, js, spec):
-        """Step 4: Assemble all components into final HTML"""
+    def assemble_game(self, html_code, css, js, spec, background):
+        """
+        Step 4: Assemble all components into the final HTML document.
+
+        The document is returned as a list of string parts rather than one string:
+        the background's base64 is the shared background['data'] object, put where the
+        JS has its placeholder, and each consumer (srcdoc_iframe, the artifact store)
+        streams through the parts, so the image isn't copied into an intermediate document.
+        Minification runs while the placeholder is still in the script.
+        """
         
-        print("\nSTEP 4: Assembling Game")
-        print("-" * 50)
+        logger.debug("Step 4: assembling game")
         
         title = spec.get('title', 'Photo Game')
         
@@ -746,60 +1080,95 @@ class ImageToGameGenerator:
         }, false);
         """
 
-        full_html = f'''<!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{title}</title>
-            <style>
-        {css}
-        {layout_fixes}
-            </style>
-        </head>
-        <body>
-        {html_code}
-            <script>
-        {scroll_prevention}
-        {js}
-            </script>
-        </body>
-        </html>'''
-        
-        print(f"Assembly complete!")
-        print(f"   Total size: {len(full_html)} chars")
-        print(f"   - HTML: {len(html_code)} chars")
-        print(f"   - CSS: {len(css)} chars")
-        print(f"   - JS: {len(js)} chars")
-        import html
-        # Escape so it can live safely inside srcdoc=""
-        escaped = html.escape(full_html, quote=True)
+        style = css + layout_fixes
+        script = "\n".join([scroll_prevention, perf_runtime_js(), world_runtime_js(spec), js])
+        raw_size = len(html_code) + len(style) + len(script)
+        if self.minify_output:
+            html_code, style, script = minify_html(html_code), minify_css(style), minify_js(script)
+        
+        document = [
+            '<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">'
+            '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+            f'<title>{title}</title><style>{style}</style></head>'
+            f'<body>{html_code}<script>'
+        ]
+        image_prefix = f"data:{background['media_type']};base64,"
+        for i, piece in enumerate(script.split(IMAGE_PLACEHOLDER)):
+            if i:
+                document += [image_prefix, background['data']]
+            document.append(piece)
+        document.append('</script></body></html>')
 
-        # IMPORTANT: allow-scripts so the JS runs
-        iframe = f"""
-            <iframe
-            srcdoc="{escaped}"
-            style="width: 100%; max-width: 920px; height: 1024px; border: 0; border-radius: 12px;"
-            sandbox="allow-scripts allow-same-origin"
-            ></iframe>
+        size = sum(len(part) for part in document)
+        self.payload = {
+            'raw': raw_size + size - len(html_code) - len(style) - len(script),
+            'document': size
+        }
+        
+        logger.info("Assembly complete: %d chars (%d before minification; HTML %d, CSS %d, JS %d without the image)",
+                    size, self.payload['raw'], len(html_code), len(style), len(script))
+        return document
+    
+    def embed_game(self, document, game_id=None):
+        """Wrap the game document (parts from assemble_game) in an iframe for gr.HTML, with a permalink if it was saved"""
+        
+        # html.escape takes ~1ms; shipping the document to a pool worker would cost more
+        iframe = srcdoc_iframe(document)
+        if game_id:
+            iframe += f"""
+            <p style="text-align: center;"><a href="/games/{game_id}" target="_blank">🔗 Permalink to this game</a></p>
             """
         return iframe
     
+    def payload_report(self, game_html, game_id=None):
+        """One line of game sizes: minification, the escaped srcdoc sent to the UI, compressed permalink copies"""
+        
+        kb = lambda n: f"{n / 1024:.1f} KB"
+        raw, size = self.payload.get('raw', 0), self.payload.get('document', 0)
+        parts = [f"{kb(raw)} → {kb(size)} minified ({(size - raw) / max(raw, 1):+.0%})" if raw != size else kb(size),
+                 f"srcdoc {kb(len(game_html))}"]
+        manifest = self.artifact_store.load_game(game_id) if game_id and self.artifact_store else None
+        if manifest is not None:
+            sizes = self.artifact_store.encoded_sizes(manifest['document'])
+            parts += [f"{encoding} {kb(sizes[encoding])}" for encoding in ("gzip", "br") if encoding in sizes]
+        return ", ".join(parts)
+    
+    def save_game(self, document, spec, analysis, background, html_code, css, js):
+        """Save the game and its inputs to the artifact store, returns the game id (None if not saved)"""
+        
+        if self.artifact_store is None:
+            return None
+        
+        try:
+            # JS still has the placeholder, so it dedupes independently of the image
+            game_id = self.artifact_store.save_game(
+                document, spec, analysis, background,
+                components={'html': html_code, 'css': css, 'js': js or ""}
+            )
+            logger.info("Game saved: /games/%s", game_id)
+            return game_id
+        except Exception as e:
+            logger.exception("Saving game failed: %s", e)
+            return None
+    
     def verify_collectible_positions(self, spec):
         """Verify collectibles aren't inside obstacles"""
         
-        print("\nVERIFICATION: Collectible Positions")
-        print("-" * 50)
+        logger.debug("Verifying collectible positions")
         
         issues = []
         
+        # Obstacles go into a uniform grid once; each collectible only checks its cell
+        grid = SpatialGrid()
+        for obstacle in spec['obstacles']:
+            grid.insert(obstacle)
+        
         for collectible in spec['collectibles']:
             cx = collectible['x']
             cy = collectible['y']
-            c_size = collectible['size']
             c_name = collectible['name']
             
-            for obstacle in spec['obstacles']:
+            for obstacle in grid.query(cx, cy):
                 ox = obstacle['x']
                 oy = obstacle['y']
                 ow = obstacle['width']
@@ -812,20 +1181,37 @@ class ImageToGameGenerator:
                     
                     issue = f"{c_name} at ({cx},{cy}) is inside {o_name} [{ox},{oy},{ox+ow},{oy+oh}]"
                     issues.append(issue)
-                    print(f"{issue}")
+                    logger.debug(issue)
+        
+        # Reachability: flood fill from the player start over the free space
+        player = spec['player']
+        size = player.get('size', 25)
+        reached = reachable_map(world_of(spec), spec['obstacles'],
+                                (player['startX'] + size / 2, player['startY'] + size / 2), size)
+        if reached is None:
+            logger.debug("Player start is inside an obstacle, skipping reachability check")
+        else:
+            flagged = {issue.split(" at ")[0] for issue in issues}
+            for collectible in spec['collectibles']:
+                if collectible['name'] in flagged:
+                    continue
+                radius = (collectible.get('size', 15) + size) / 2
+                if not can_reach(reached, collectible['x'], collectible['y'], radius):
+                    issue = f"{collectible['name']} at ({collectible['x']},{collectible['y']}) is unreachable from the player start"
+                    issues.append(issue)
+                    logger.debug(issue)
         
         if not issues:
-            print("All collectibles are reachable!")
+            logger.debug("All collectibles are reachable")
         else:
-            print(f"Found {len(issues)} position issues")
+            logger.info("Found %d position issues", len(issues))
         
         return issues
     
     def repair_collectible_positions(self, spec, issues):
         """Repair collectibles that overlap obstacles"""
         
-        print("\nREPAIR: Fixing Collectible Positions")
-        print("-" * 50)
+        logger.debug("Repairing collectible positions")
         
         # Extract which collectibles have issues
         broken_collectibles = []
@@ -834,40 +1220,20 @@ class ImageToGameGenerator:
             c_name = issue.split(" at ")[0]
             broken_collectibles.append(c_name)
         
-        print(f"Broken collectibles: {', '.join(broken_collectibles)}")
+        logger.info("Broken collectibles: %s", ", ".join(broken_collectibles))
         
-        prompt = f"""Fix the collectible positions in this game spec.
-
-    CURRENT SPEC:
-    {json.dumps(spec, indent=2)}
-
-    PROBLEMS FOUND:
-    {chr(10).join([f"- {issue}" for issue in issues])}
-
-    TASK:
-    Generate NEW positions for these collectibles: {', '.join(broken_collectibles)}
-
-    RULES:
-    - Keep same collectibles (names, sizes, colors)
-    - Change ONLY their x,y positions
-    - Must NOT overlap any obstacle rectangles
-    - Must be at least 20 pixels from obstacle edges
-    - Must be reachable by player
-
-    Return ONLY a JSON array of the fixed collectibles with this structure:
-    [
-    {{"name": "Item", "x": 123, "y": 456, "size": 15, "color": "#FFD700", "collected": false}}
-    ]
-
-    Return ONLY the JSON array, no explanations."""
+        prompt = self._prompt("repair_positions")
+        text = prompt.render(spec=json.dumps(spec, indent=2), issues=chr(10).join([f"- {issue}" for issue in issues]),
+                             names=', '.join(broken_collectibles))
 
         try:
-            print("Asking Claude to fix positions...")
+            logger.debug("Asking Claude to fix positions")
             
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "repair_positions",
+                prompt=prompt,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             json_text = response.content[0].text
@@ -885,43 +1251,33 @@ class ImageToGameGenerator:
                 for i, original in enumerate(spec['collectibles']):
                     if original['name'] == fixed['name']:
                         spec['collectibles'][i] = fixed
-                        print(f"✅ Fixed {fixed['name']}: ({fixed['x']}, {fixed['y']})")
+                        logger.debug("Fixed %s: (%s, %s)", fixed['name'], fixed['x'], fixed['y'])
             
             return spec
             
+        except GenerationCancelled:
+            raise
         except Exception as e:
-            print(f"Repair failed: {e}")
+            logger.error("Repair failed: %s", e)
             return spec  # Return original if repair fails
         
     def repair_html_component(self, html, issues, spec):
         """Repair HTML component"""
         
-        print(f"Repairing HTML ({len(issues)} issues)...")
+        logger.info("Repairing HTML (%d issues)", len(issues))
         
         contracts = spec['contracts']
         issues_text = "\n".join([f"- {issue}" for issue in issues])
         
-        prompt = f"""Fix this HTML component.
-
-        ISSUES:
-        {issues_text}
-
-        ORIGINAL HTML:
-        {html}
-
-        REQUIRED IDs:
-        - {contracts['container_id']}
-        - {contracts['canvas_id']} (800x600)
-        - {contracts['score_id']}
-        - {contracts['timer_id']}
-
-        Fix the issues. Return ONLY the corrected HTML (no explanations)."""
+        prompt = self._prompt("repair_html")
+        text = prompt.render(issues=issues_text, html=html, **contracts)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "repair_html",
+                prompt=prompt,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             fixed = response.content[0].text
@@ -930,40 +1286,32 @@ class ImageToGameGenerator:
             elif "```" in fixed:
                 fixed = fixed.split("```")[1].split("```")[0].strip()
             
-            print(f"HTML repaired")
+            logger.info("HTML repaired")
             return fixed
             
+        except GenerationCancelled:
+            raise
         except Exception as e:
-            print(f"Repair failed: {e}")
+            logger.error("Repair failed: %s", e)
             return html     
     
     def repair_css_component(self, css, issues, spec):
         """Repair CSS component"""
         
-        print(f"Repairing CSS ({len(issues)} issues)...")
+        logger.info("Repairing CSS (%d issues)", len(issues))
         
         contracts = spec['contracts']
         issues_text = "\n".join([f"- {issue}" for issue in issues])
         
-        prompt = f"""Fix this CSS component.
-
-        ISSUES:
-        {issues_text}
-
-        ORIGINAL CSS:
-        {css}
-
-        REQUIRED SELECTORS:
-        - #{contracts['canvas_id']}
-        - #{contracts['container_id']}
-
-        Fix the issues. Return ONLY the corrected CSS (no explanations)."""
+        prompt = self._prompt("repair_css")
+        text = prompt.render(issues=issues_text, css=css, **contracts)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "repair_css",
+                prompt=prompt,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             fixed = response.content[0].text
@@ -972,41 +1320,32 @@ class ImageToGameGenerator:
             elif "```" in fixed:
                 fixed = fixed.split("```")[1].split("```")[0].strip()
             
-            print(f"CSS repaired")
+            logger.info("CSS repaired")
             return fixed
             
+        except GenerationCancelled:
+            raise
         except Exception as e:
-            print(f"Repair failed: {e}")
+            logger.error("Repair failed: %s", e)
             return css
     
-    def repair_js_component(self, js, issues, spec, image_base64):
+    def repair_js_component(self, js, issues, spec):
         """Repair JavaScript component"""
         
-        print(f"Repairing JavaScript ({len(issues)} issues)...")
+        logger.info("Repairing JavaScript (%d issues)", len(issues))
         
         contracts = spec['contracts']
         issues_text = "\n".join([f"- {issue}" for issue in issues])
         
-        prompt = f"""Fix this JavaScript component.
-
-        ISSUES:
-        {issues_text}
-
-        ORIGINAL JS:
-        {js[:3000]}...
-
-        REQUIRED:
-        - Functions: startGame(), gameLoop(), draw()
-        - Use IDs: {contracts['canvas_id']}, {contracts['score_id']}, {contracts['timer_id']}
-        - requestAnimationFrame in game loop
-
-        Fix the issues. Return ONLY the corrected JavaScript (no explanations)."""
+        prompt = self._prompt("repair_js")
+        text = prompt.render(issues=issues_text, js=js[:3000], **contracts)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create_message(
+                "repair_js",
+                prompt=prompt,
                 max_tokens=3500,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": text}]
             )
             
             fixed = response.content[0].text
@@ -1017,13 +1356,13 @@ class ImageToGameGenerator:
             elif "```" in fixed:
                 fixed = fixed.split("```")[1].split("```")[0].strip()
             
-            # Re-inject image
-            if 'PLACEHOLDER_IMAGE_DATA' in fixed:
-                fixed = fixed.replace('PLACEHOLDER_IMAGE_DATA', f'data:image/jpeg;base64,{image_base64}')
+            fixed = self._image_placeholder(fixed)
             
-            print(f"JavaScript repaired")
+            logger.info("JavaScript repaired")
             return fixed
             
+        except GenerationCancelled:
+            raise
         except Exception as e:
-            print(f"Repair failed: {e}")
+            logger.error("Repair failed: %s", e)
             return js
\ No newline at end of file
@@ -0,0 +1,201 @@
+import json
+import os
+
+
+# Broad-phase cell size in world pixels
+RUNTIME_GRID_CELL = 128
+
+# Frame-time overlay visible from the start (it can always be toggled with the ` key)
+GAME_PERF_OVERLAY = os.getenv("GAME_PERF_OVERLAY", "0") == "1"
+# Post a frame-time summary to the embedding page every 10s and when the game closes
+GAME_PERF_REPORT = os.getenv("GAME_PERF_REPORT", "1") == "1"
+PERF_MESSAGE_TYPE = "image-to-game:perf"
+
+
+def _script_json(value):
+    """JSON that is safe inside an inline <script>"""
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+
+def world_runtime_js(spec, canvas_size=(800, 600)):
+    """
+    window.GameWorld for the assembled game: the level's entities, a uniform-grid
+    broad phase (nearby) so collision checks only see close obstacles, a camera
+    that follows the player with culling (visible) for worlds larger than the
+    canvas, and drawStatic, which renders background + obstacles + labels to an
+    offscreen canvas once and then only copies the visible part each frame.
+    """
+    world = spec.get('world') or {"width": canvas_size[0], "height": canvas_size[1]}
+    level = {
+        "world": world,
+        "obstacles": spec.get('obstacles', []),
+        "collectibles": spec.get('collectibles', []),
+        "goal": spec.get('goal'),
+        "player": spec.get('player'),
+    }
+    return f"""
+        (function () {{
+            const level = {_script_json(level)};
+            const CELL = {RUNTIME_GRID_CELL};
+            const cells = new Map();
+            const span = (x, y, w, h) => [Math.floor(x / CELL), Math.floor(y / CELL),
+                                          Math.floor((x + w) / CELL), Math.floor((y + h) / CELL)];
+            level.obstacles.forEach((o) => {{
+                const [c0, r0, c1, r1] = span(o.x, o.y, o.width, o.height);
+                for (let c = c0; c <= c1; c++) for (let r = r0; r <= r1; r++) {{
+                    const key = c + ',' + r;
+                    if (!cells.has(key)) cells.set(key, []);
+                    cells.get(key).push(o);
+                }}
+            }});
+
+            function nearby(x, y, w, h) {{
+                const [c0, r0, c1, r1] = span(x, y, w || 0, h || 0);
+                const found = new Set();
+                for (let c = c0; c <= c1; c++) for (let r = r0; r <= r1; r++) {{
+                    (cells.get(c + ',' + r) || []).forEach((o) => found.add(o));
+                }}
+                return Array.from(found);
+            }}
+
+            const camera = {{ x: 0, y: 0, width: {canvas_size[0]}, height: {canvas_size[1]} }};
+
+            function follow(target) {{
+                const size = target.size || 0;
+                camera.x = Math.max(0, Math.min(level.world.width - camera.width, target.x + size / 2 - camera.width / 2));
+                camera.y = Math.max(0, Math.min(level.world.height - camera.height, target.y + size / 2 - camera.height / 2));
+            }}
+
+            function visible(items, margin) {{
+                const m = margin || 50;
+                return items.filter((o) => {{
+                    const w = o.width || o.size || 0, h = o.height || o.size || 0;
+                    return o.x + w >= camera.x - m && o.x <= camera.x + camera.width + m &&
+                           o.y + h >= camera.y - m && o.y <= camera.y + camera.height + m;
+                }});
+            }}
+
+            // Static layers (background, obstacles, labels) are drawn once, offscreen
+            let layer = null, layerHasImage = false;
+            const imageReady = (img) => img && img.complete && img.naturalWidth > 0;
+
+            function buildLayer(bgImage) {{
+                layer = document.createElement('canvas');
+                layer.width = level.world.width;
+                layer.height = level.world.height;
+                const g = layer.getContext('2d');
+                layerHasImage = imageReady(bgImage);
+                if (layerHasImage) g.drawImage(bgImage, 0, 0, layer.width, layer.height);
+                g.textAlign = 'center';
+                g.textBaseline = 'middle';
+                g.font = '12px sans-serif';
+                level.obstacles.forEach((o) => {{
+                    g.globalAlpha = 0.25;
+                    g.fillStyle = o.color || '#8B4513';
+                    g.fillRect(o.x, o.y, o.width, o.height);
+                    g.globalAlpha = 1;
+                    g.lineWidth = 2;
+                    g.strokeStyle = '#000';
+                    g.strokeRect(o.x, o.y, o.width, o.height);
+                    g.fillStyle = '#000';
+                    g.fillText(o.name || '', o.x + o.width / 2, o.y + o.height / 2, o.width - 4);
+                }});
+            }}
+
+            function drawStatic(ctx, bgImage) {{
+                // Rebuilt once if the background finishes loading after the first frame
+                if (!layer || (!layerHasImage && imageReady(bgImage))) buildLayer(bgImage);
+                ctx.drawImage(layer, camera.x, camera.y, camera.width, camera.height,
+                              camera.x, camera.y, camera.width, camera.height);
+            }}
+
+            window.GameWorld = Object.assign(level, {{
+                drawStatic: drawStatic,
+                nearby: nearby,
+                camera: camera,
+                follow: follow,
+                visible: visible,
+                begin: (ctx) => {{ ctx.save(); ctx.translate(-Math.round(camera.x), -Math.round(camera.y)); }},
+                end: (ctx) => ctx.restore(),
+            }});
+        }})();
+        """
+
+
+def perf_runtime_js(report=GAME_PERF_REPORT, overlay=GAME_PERF_OVERLAY, interval_ms=10000):
+    """
+    Frame-time instrumentation: wraps requestAnimationFrame (transparently for the
+    generated code) to time each frame's work and the interval between frames.
+    The ` key toggles an FPS / frame-time overlay; with report on, a summary is
+    posted to the embedding page as {type: PERF_MESSAGE_TYPE, ...}.
+    """
+    return f"""
+        (function () {{
+            const SAMPLES = 240;
+            const work = [], intervals = [];
+            let frameTs = -1, frameWork = 0, frames = 0, longFrames = 0;
+
+            function endFrame(nextTs) {{
+                if (frameTs >= 0) {{
+                    work.push(frameWork);
+                    intervals.push(nextTs - frameTs);
+                    if (nextTs - frameTs > 34) longFrames++;
+                    if (work.length > SAMPLES) {{ work.shift(); intervals.shift(); }}
+                    frames++;
+                }}
+                frameTs = nextTs;
+                frameWork = 0;
+            }}
+
+            const raf = window.requestAnimationFrame.bind(window);
+            window.requestAnimationFrame = function (callback) {{
+                return raf(function (ts) {{
+                    // Several loops may share a frame; their work adds up
+                    if (ts !== frameTs) endFrame(ts);
+                    const start = performance.now();
+                    try {{ callback(ts); }} finally {{ frameWork += performance.now() - start; }}
+                }});
+            }};
+
+            function summary() {{
+                if (!intervals.length) return null;
+                const sorted = work.slice().sort((a, b) => a - b);
+                const meanInterval = intervals.reduce((a, b) => a + b, 0) / intervals.length;
+                return {{
+                    type: '{PERF_MESSAGE_TYPE}',
+                    fps: Math.round(1000 / meanInterval * 10) / 10,
+                    frameMs: Math.round(sorted.reduce((a, b) => a + b, 0) / sorted.length * 100) / 100,
+                    frameP95Ms: Math.round(sorted[Math.floor(sorted.length * 0.95)] * 100) / 100,
+                    longFrames: longFrames,
+                    frames: frames,
+                    title: document.title,
+                }};
+            }}
+
+            let panel = null;
+            function togglePanel() {{
+                if (panel) {{ panel.remove(); panel = null; return; }}
+                panel = document.createElement('div');
+                panel.style.cssText = 'position:fixed;top:4px;left:4px;z-index:9999;padding:4px 8px;' +
+                    'font:12px monospace;color:#0f8;background:rgba(0,0,0,.7);border-radius:4px;pointer-events:none';
+                document.body.appendChild(panel);
+            }}
+            setInterval(function () {{
+                const s = summary();
+                if (panel && s) panel.textContent = s.fps + ' fps | ' + s.frameMs + ' ms avg | ' +
+                    s.frameP95Ms + ' ms p95 | ' + s.longFrames + ' long';
+            }}, 500);
+            window.addEventListener('keydown', function (e) {{ if (e.key === '`') togglePanel(); }});
+            if ({'true' if overlay else 'false'}) window.addEventListener('DOMContentLoaded', togglePanel);
+
+            function report() {{
+                const s = summary();
+                if (s && window.parent !== window) window.parent.postMessage(s, '*');
+            }}
+            if ({'true' if report else 'false'}) {{
+                setInterval(report, {interval_ms});
+                window.addEventListener('pagehide', report);
+            }}
+            window.GamePerf = {{ summary: summary, toggle: togglePanel }};
+        }})();
+        """
@@ -0,0 +1,102 @@
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Candidates per component stage (1 = off, the old single-call behaviour)
+HEDGE_CANDIDATES = int(os.getenv("HEDGE_CANDIDATES", "1"))
+# Stages that may be hedged
+HEDGE_STAGES = {s.strip() for s in os.getenv("HEDGE_STAGES", "html,css,js").split(",") if s.strip()}
+# 0: launch every candidate at once (best-of-N).
+# e.g. 90: start a backup once the first call is slower than the stage's p90 latency.
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+
+logger = logging.getLogger(__name__)
+
+
+def hedge_delay(stage, model, stats, percentile=HEDGE_PERCENTILE):
+    """
+    Seconds to wait before starting a backup candidate:
+    0 launches all candidates at once, None waits until earlier candidates fail
+    (also while the stage/model pair has too few latency samples).
+    """
+    if percentile <= 0:
+        return 0.0
+    return stats.latency_percentile(stage, model, percentile)
+
+
+def hedged(stage, run_candidate, verify, parent, candidates=HEDGE_CANDIDATES, delay=0.0):
+    """
+    Run up to `candidates` attempts of one stage and return the first result that
+    passes verification; the other attempts are cancelled (their calls aborted).
+
+    run_candidate(context) produces a result under its own child RunContext,
+    verify(result) returns a list of issues. Extra candidates start after `delay`
+    seconds (see hedge_delay) or as soon as every running one has failed.
+    If nothing passes, the result with the fewest issues is returned; if every
+    candidate raised, the last exception is re-raised (e.g. BudgetExceeded).
+    """
+    candidates_by_future = {}
+    pending = set()
+    best = None
+    error = None
+    last_launch = 0.0
+
+    def launch():
+        nonlocal last_launch
+        child = parent.child()
+        # Candidates log under the run's id (context variables don't follow work into the pool)
+        future = _executor.submit(contextvars.copy_context().run, run_candidate, child)
+        candidates_by_future[future] = (len(candidates_by_future) + 1, child)
+        pending.add(future)
+        last_launch = time.monotonic()
+
+    try:
+        launch()
+        while pending or len(candidates_by_future) < candidates:
+            can_launch = len(candidates_by_future) < candidates
+            if can_launch and (not pending or delay == 0):
+                launch()
+                continue
+
+            timeout = None
+            if can_launch and delay is not None:
+                timeout = max(0.0, last_launch + delay - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            parent.check(stage)
+            if not done:
+                logger.info("%s: no answer after %.1fs, starting backup candidate %d",
+                            stage, delay, len(candidates_by_future) + 1)
+                launch()
+                continue
+
+            for future in done:
+                number = candidates_by_future[future][0]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning("%s: candidate %d failed: %s", stage, number, e)
+                    error = e
+                    continue
+                issues = verify(result)
+                if not issues:
+                    logger.info("%s: accepted candidate %d of %d", stage, number, len(candidates_by_future))
+                    return result
+                if best is None or len(issues) < len(best[0]):
+                    best = (issues, result)
+
+        parent.check(stage)
+        if best is None:
+            raise error
+        return best[1]
+    finally:
+        # Abort the candidates still running; finished ones have nothing in flight
+        for future, (number, child) in candidates_by_future.items():
+            if not future.done():
+                child.cancel("another candidate won")
+            child.close()
@@ -0,0 +1,96 @@
+import collections
+import os
+import threading
+
+
+# Near-duplicate uploads (re-crops, recompressions, screenshots) reuse an earlier
+# analysis + spec when their 64-bit dHashes differ in at most this many bits
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_INDEX_SIZE = int(os.getenv("PHASH_INDEX_SIZE", "100000"))
+# PHASH_INDEX=0 disables the lookup
+PHASH_INDEX = os.getenv("PHASH_INDEX", "1") != "0"
+
+HASH_BITS = 64
+
+
+def _flip_masks(bits, radius):
+    """Every mask of `bits` bits with at most `radius` bits set"""
+    masks = [0]
+    frontier = [(0, -1)]
+    for _ in range(radius):
+        frontier = [(mask | (1 << i), i) for mask, last in frontier for i in range(last + 1, bits)]
+        masks.extend(mask for mask, _ in frontier)
+    return masks
+
+
+class PerceptualIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes.
+
+    The hash is split into `chunks` substrings, each with its own table. Two hashes
+    within Hamming distance d agree to within d // chunks bits on at least one
+    substring (pigeonhole), so probing every table with those few bit flips finds
+    all candidates; they are then checked against the full distance.
+
+    Entries belong to a scope (the API key's fingerprint): a lookup only matches
+    hashes added under the same scope, so one user never gets another's analysis.
+    """
+
+    def __init__(self, max_distance=PHASH_MAX_DISTANCE, max_entries=PHASH_INDEX_SIZE, chunks=4):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._probes = _flip_masks(self.chunk_bits, max_distance // chunks)
+        self._tables = [collections.defaultdict(list) for _ in range(chunks)]
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _split(self, phash):
+        return [(phash >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def add(self, phash, value, scope=None):
+        entry = (scope, phash)
+        with self._lock:
+            if entry in self._entries:
+                self._entries[entry] = value
+                self._entries.move_to_end(entry)
+                return
+            self._entries[entry] = value
+            for table, part in zip(self._tables, self._split(phash)):
+                table[part].append(entry)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry):
+        del self._entries[entry]
+        for table, part in zip(self._tables, self._split(entry[1])):
+            bucket = table[part]
+            bucket.remove(entry)
+            if not bucket:
+                del table[part]
+
+    def lookup(self, phash, scope=None):
+        """(distance, value) of the closest hash stored under scope within max_distance, or None"""
+        best = None
+        with self._lock:
+            seen = set()
+            for table, part in zip(self._tables, self._split(phash)):
+                for probe in self._probes:
+                    for candidate in table.get(part ^ probe, ()):
+                        if candidate in seen or candidate[0] != scope:
+                            continue
+                        seen.add(candidate)
+                        distance = (candidate[1] ^ phash).bit_count()
+                        if distance <= self.max_distance and (best is None or distance < best[0]):
+                            best = (distance, candidate)
+            if best is None:
+                return None
+            return best[0], self._entries[best[1]]
+
+
+scene_index = PerceptualIndex()
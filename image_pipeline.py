@@ -0,0 +1,127 @@
+import base64
+import io
+import logging
+
+# PIL, NumPy and scene_layout are imported by the functions that decode images,
+# so importing this module (e.g. for data_uri) doesn't load them at startup
+
+
+# Claude Vision bills roughly (width * height) / 750 input tokens per image,
+# so the analysis copy stays well under the old 1200x900 (~1440 tokens).
+ANALYSIS_MAX_SIZE = (768, 576)
+
+logger = logging.getLogger(__name__)
+
+# The game canvas is always 800x600, so the background is never stored larger than that.
+# Smaller uploads are kept as-is and stretched by drawImage on the canvas.
+DISPLAY_SIZE = (800, 600)
+
+# Panoramas at least this wide (aspect ratio) become scrolling worlds in "auto" world mode
+PANORAMA_ASPECT = 1.6
+WORLD_MAX_WIDTH = 4800
+
+MEDIA_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+def encode_rendition(img, image_format="JPEG", quality=75, progressive=True):
+    """Encode a PIL image and return it as a base64 rendition dict"""
+    image_format = image_format.upper()
+    if image_format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=progressive)
+    else:
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+
+    raw = buffer.getvalue()
+    return {
+        "data": base64.b64encode(raw).decode("utf-8"),
+        "media_type": MEDIA_TYPES[image_format],
+        "width": img.size[0],
+        "height": img.size[1],
+        "bytes": len(raw),
+    }
+
+
+def perceptual_hash(img, size=8):
+    """
+    64-bit dHash: grayscale (size+1)x(size) thumbnail, one bit per horizontal
+    gradient sign. Survives re-crops, recompression and screenshots of the same scene.
+    """
+    import numpy as np
+    from PIL import Image
+
+    small = img.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def world_size(image_size, world_mode="screen"):
+    """
+    Level size in pixels: the 800x600 canvas, or for panoramas in "auto" mode a
+    600px-high world as wide as the image's aspect ratio allows
+    """
+    width, height = image_size
+    if world_mode != "auto" or width / height < PANORAMA_ASPECT:
+        return DISPLAY_SIZE
+    return (min(WORLD_MAX_WIDTH, round(DISPLAY_SIZE[1] * width / height)), DISPLAY_SIZE[1])
+
+
+def prepare_renditions(image_path, image_format="JPEG", analysis_quality=70,
+                       display_quality=75, progressive=True, world_mode="screen"):
+    """
+    Decode an image once and produce both renditions:
+    - analysis: small copy for the vision call (fewer upload bytes and input tokens)
+    - display: background for the level - the 800x600 canvas, or a scrolling
+      world for panoramas (downscaled, never upscaled)
+    plus the perceptual hash of the image for near-duplicate lookup, the level
+    size and the obstacle / free-space rectangles measured from it (level coordinates)
+    """
+    from PIL import Image
+
+    img = Image.open(image_path)
+    world = world_size(img.size, world_mode)
+
+    # For JPEGs, let the decoder downscale in the DCT domain. draft() never goes
+    # below the requested size, so both renditions can still be made from it.
+    if img.format == "JPEG":
+        img.draft("RGB", world)
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # Only ever downscale, each axis independently
+    display_size = (min(img.size[0], world[0]), min(img.size[1], world[1]))
+    display = img if display_size == img.size else img.resize(display_size, Image.Resampling.LANCZOS)
+
+    analysis = img.copy()
+    analysis.thumbnail(ANALYSIS_MAX_SIZE, Image.Resampling.LANCZOS)
+
+    return {
+        "analysis": encode_rendition(analysis, image_format, analysis_quality, progressive),
+        "display": encode_rendition(display, image_format, display_quality, progressive),
+        "phash": perceptual_hash(display),
+        "world": {"width": world[0], "height": world[1]},
+        "layout": measure_layout(display, world),
+    }
+
+
+def measure_layout(display, world):
+    """scene_layout.propose_layout, but a failure only drops the layout hint, never the upload"""
+    try:
+        from scene_layout import propose_layout
+        return propose_layout(display, world)
+    except Exception:
+        logger.exception("Measuring the scene layout failed")
+        return {"obstacles": [], "free": []}
+
+
+def data_uri(rendition):
+    """Build a data: URI for embedding a rendition in the game"""
+    return f"data:{rendition['media_type']};base64,{rendition['data']}"
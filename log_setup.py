@@ -0,0 +1,123 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+
+
+# Correlation id of the run the current code is working for ("-" outside a run)
+run_id = contextvars.ContextVar("run_id", default="-")
+
+# LogRecord attributes that aren't user-supplied extra={...} fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "run_id"}
+
+_listener = None
+_traceback_formatter = logging.Formatter()
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+class RunIdFilter(logging.Filter):
+    """Stamp records with the run id where they are created (the writer thread has no run)"""
+
+    def filter(self, record):
+        record.run_id = run_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Like QueueHandler, but keeps the traceback separate from the message for the JSON output"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None, stream=None):
+    """
+    Route all logging through a queue: callers only enqueue the record, and a
+    background thread formats and writes it, so a slow stdout never blocks a
+    request. Safe to call more than once.
+
+    level: LOG_LEVEL, default INFO (one line per call/step; DEBUG adds every verification check)
+    fmt: LOG_FORMAT, "json" (default, one object per line) or "text" for local runs
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(run_id)s] %(name)s: %(message)s"))
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(RunIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # One INFO line per HTTP request from the SDK's client is noise next to our per-call line
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def with_run_id(steps, value):
+    """
+    Run a generator with the run id set each time it resumes. Gradio advances a
+    generator from worker threads that don't share context variables, so setting
+    the id once at the start would not reach later steps.
+    """
+    try:
+        while True:
+            token = run_id.set(value)
+            try:
+                event = next(steps)
+            except StopIteration:
+                return
+            finally:
+                run_id.reset(token)
+            yield event
+    finally:
+        token = run_id.set(value)
+        try:
+            steps.close()
+        finally:
+            run_id.reset(token)
@@ -0,0 +1,171 @@
+import os
+import re
+
+
+# Whitespace/comment minification of the assembled game ("0" ships the code as written)
+MINIFY_OUTPUT = os.getenv("MINIFY_OUTPUT", "1") == "1"
+
+# Conservative by design: strings, template literals and regex literals are copied
+# verbatim, and a line break is kept wherever the source had one, so automatic
+# semicolon insertion behaves exactly as before. Only indentation, comments and
+# spaces that can't separate two tokens are removed.
+#
+# String patterns are "unrolled" ([^"\\]*(?:\\.[^"\\]*)*): a repeated alternation
+# makes re keep backtracking state for every character, ~15MB for a 100KB string.
+
+_JS_TOKEN = re.compile(r"""
+    (?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*')
+  | (?P<comment>/\*.*?\*/|//[^\n]*)
+  | (?P<space>\s+)
+  | (?P<template>`)
+  | (?P<slash>/)
+  | (?P<word>[\w$]+)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+_REGEX_LITERAL = re.compile(r"/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*")
+_TEMPLATE_STOP = re.compile(r"[`\\$]")
+# A '/' after these starts a regex literal, anywhere else it divides
+_REGEX_AFTER_PUNCT = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_AFTER_WORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+                      "void", "throw", "instanceof", "yield", "await"}
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in "_$" or ord(ch) > 127
+
+
+def _template_end(source, start):
+    """Index just past the template literal opening at start (handles ${...} nesting)"""
+    pos = start + 1
+    while True:
+        match = _TEMPLATE_STOP.search(source, pos)
+        if match is None:
+            return len(source)
+        pos = match.end()
+        ch = match.group()
+        if ch == "`":
+            return pos
+        if ch == "\\":
+            pos += 1
+        elif source.startswith("{", pos):
+            pos = _expression_end(source, pos + 1)
+
+
+def _expression_end(source, pos):
+    """Index just past the } closing a ${ expression that starts at pos"""
+    depth = 1
+    while pos < len(source):
+        ch = source[pos]
+        if ch in "\"'":
+            match = _JS_TOKEN.match(source, pos)
+            pos = match.end() if match.lastgroup == "string" else pos + 1
+            continue
+        if ch == "`":
+            pos = _template_end(source, pos)
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return pos
+
+
+def minify_js(source):
+    """Strip comments and indentation from JavaScript, leaving every token as it was"""
+    out = []
+    last = ""          # last emitted significant token
+    pending = None     # whitespace seen since it: None, " " or "\n"
+    pos = 0
+    while pos < len(source):
+        match = _JS_TOKEN.match(source, pos)
+        kind, text = match.lastgroup, match.group()
+        end = match.end()
+
+        if kind == "space" or kind == "comment":
+            if "\n" in text or (kind == "comment" and text.startswith("//")):
+                pending = "\n"
+            elif pending is None:
+                pending = " "
+            pos = end
+            continue
+
+        if kind == "template":
+            end = _template_end(source, pos)
+            text = source[pos:end]
+        elif kind == "slash":
+            regex_allowed = (not last or last[-1] in _REGEX_AFTER_PUNCT or last in _REGEX_AFTER_WORDS)
+            literal = _REGEX_LITERAL.match(source, pos) if regex_allowed else None
+            if literal is not None:
+                end = literal.end()
+                text = literal.group()
+
+        if pending and last:
+            if pending == "\n":
+                out.append("\n")
+            elif (_is_word_char(last[-1]) and _is_word_char(text[0])) or \
+                    (last[-1] == text[0] and text[0] in "+-/") or \
+                    (last[-1] in "+-" and text[0] in "+-") or \
+                    (last.isdigit() and text[0] == "."):
+                # "a b", "a + +b", "a - -b", "x / /re/", "1 .toFixed" need their space
+                out.append(" ")
+        pending = None
+        out.append(text)
+        last = text
+        pos = end
+    return "".join(out)
+
+
+_CSS_TOKEN = re.compile(r"""
+    (?P<string>"[^"\\]*(?:\\.[^"\\]*)*"|'[^'\\]*(?:\\.[^'\\]*)*')
+  | (?P<comment>/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<other>[^"'/\s{};,>:]+|.)
+""", re.VERBOSE | re.DOTALL)
+
+# No space is needed on either side of these (":" only after it: "a :hover" != "a:hover")
+_CSS_TIGHT = set("{};,>")
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from CSS"""
+    out = []
+    pending = False
+    for match in _CSS_TOKEN.finditer(source):
+        kind, text = match.lastgroup, match.group()
+        if kind == "space" or kind == "comment":
+            pending = True
+            continue
+        if out and pending and out[-1][-1] not in _CSS_TIGHT and out[-1] != ":" and text[0] not in _CSS_TIGHT:
+            out.append(" ")
+        if text == "}" and out and out[-1] == ";":
+            out.pop()
+        pending = False
+        out.append(text)
+    return "".join(out)
+
+
+# Contents of these elements are copied verbatim (whitespace matters, or it's code)
+_HTML_RAW = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_HTML_SPACE = re.compile(r"\s+")
+
+
+def minify_html(source):
+    """
+    Drop comments and collapse whitespace runs to one character. Runs are not
+    removed outright, since a space between inline elements is visible.
+    """
+    parts = _HTML_RAW.split(source)
+    out = []
+    # split() yields text, raw block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        text = _HTML_COMMENT.sub("", parts[i])
+        out.append(_HTML_SPACE.sub(lambda m: "\n" if "\n" in m.group() else " ", text))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return "".join(out).strip()
+
@@ -0,0 +1,127 @@
+import collections
+import os
+import threading
+
+
+SONNET = "claude-sonnet-4-20250514"
+HAIKU = "claude-3-5-haiku-20241022"
+
+DEFAULT_MODEL = os.getenv("CLAUDE_MODEL", SONNET)
+
+# Candidate models per stage, preferred first. Vision analysis and game logic stay
+# on the heavier model; the formulaic HTML/CSS pieces try the fast one first.
+DEFAULT_ROUTES = {
+    "analysis": [DEFAULT_MODEL],
+    "design": [DEFAULT_MODEL],
+    "spec": [DEFAULT_MODEL],
+    "html": [HAIKU, DEFAULT_MODEL],
+    "css": [HAIKU, DEFAULT_MODEL],
+    "js": [DEFAULT_MODEL],
+    "repair_positions": [DEFAULT_MODEL],
+    "repair_html": [HAIKU, DEFAULT_MODEL],
+    "repair_css": [HAIKU, DEFAULT_MODEL],
+    "repair_js": [DEFAULT_MODEL],
+}
+
+# A model is only picked for its speed while it keeps passing verification this often
+MIN_PASS_RATE = float(os.getenv("ROUTE_MIN_PASS_RATE", "0.8"))
+# Calls a stage/model pair needs before its stats are trusted
+ROUTE_MIN_SAMPLES = int(os.getenv("ROUTE_MIN_SAMPLES", "5"))
+
+
+def parse_routes(value):
+    """'css=claude-3-5-haiku-20241022,js=a|b' -> {'css': ['claude-3-5-haiku-20241022'], 'js': ['a', 'b']}"""
+    routes = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            stage, models = part.split("=", 1)
+            routes[stage.strip()] = [m.strip() for m in models.split("|") if m.strip()]
+    return routes
+
+
+ROUTES = dict(DEFAULT_ROUTES, **parse_routes(os.getenv("MODEL_ROUTES")))
+
+
+class ModelStats:
+    """Process-wide latency and verification pass rate per (stage, model)"""
+
+    def __init__(self, size=200):
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=size))
+        self._checks = collections.defaultdict(lambda: collections.deque(maxlen=size))
+        self._lock = threading.Lock()
+
+    def record_latency(self, stage, model, seconds):
+        with self._lock:
+            self._latencies[stage, model].append(seconds)
+
+    def record_verification(self, stage, model, passed):
+        with self._lock:
+            self._checks[stage, model].append(bool(passed))
+
+    def latency_percentile(self, stage, model, pct, min_samples=ROUTE_MIN_SAMPLES):
+        """pct-th percentile latency, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self._latencies[stage, model])
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def pass_rate(self, stage, model, min_samples=ROUTE_MIN_SAMPLES):
+        """Share of verified outputs that passed, or None without enough samples"""
+        with self._lock:
+            checks = list(self._checks[stage, model])
+        if len(checks) < min_samples:
+            return None
+        return sum(checks) / len(checks)
+
+    def report(self):
+        """One line per stage/model pair: calls, p50/p90 latency, pass rate"""
+        with self._lock:
+            pairs = sorted(set(self._latencies) | set(self._checks))
+        lines = []
+        for stage, model in pairs:
+            with self._lock:
+                calls = len(self._latencies[stage, model])
+                checks = list(self._checks[stage, model])
+            p50 = self.latency_percentile(stage, model, 50, min_samples=1)
+            p90 = self.latency_percentile(stage, model, 90, min_samples=1)
+            line = f"{stage} / {model}: {calls} calls"
+            if p50 is not None:
+                line += f", p50 {p50:.1f}s, p90 {p90:.1f}s"
+            if checks:
+                line += f", {sum(checks)}/{len(checks)} passed verification"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+model_stats = ModelStats()
+
+
+class ModelRouter:
+    """
+    Picks the model for each stage from the routing table.
+    With several candidates, each is tried until it has enough samples; after that
+    the fastest one (p50) whose verification pass rate is still acceptable wins.
+    """
+
+    def __init__(self, routes=None, default_model=DEFAULT_MODEL, stats=model_stats, min_pass_rate=MIN_PASS_RATE):
+        self.routes = routes or ROUTES
+        self.default_model = default_model
+        self.stats = stats
+        self.min_pass_rate = min_pass_rate
+
+    def pick(self, stage):
+        models = self.routes.get(stage) or [self.default_model]
+        if len(models) == 1:
+            return models[0]
+
+        usable = []
+        for model in models:
+            p50 = self.stats.latency_percentile(stage, model, 50)
+            if p50 is None:
+                # Not enough data yet - keep trying models in preference order
+                return model
+            rate = self.stats.pass_rate(stage, model)
+            if rate is None or rate >= self.min_pass_rate:
+                usable.append((p50, model))
+        return min(usable)[1] if usable else models[-1]
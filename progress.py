@@ -0,0 +1,54 @@
+"""
+Progress events yielded by ImageToGameGenerator.generate_game.
+
+Each event is a dict with a 'type' and only what changed at that step, so the
+analysis text, the spec and the game document are each sent once instead of
+with every update. app.py turns events into updates of the affected component.
+
+  queued    {'position', 'wait'}            waiting for a free slot (0-based place
+                                            in line, estimated seconds left)
+  analysis  {'analysis'}                    the scene analysis (once)
+  status    {'stage', 'message', 'placeholder'}
+                                            a step finished: one line for the
+                                            log, optional text for the game area
+  spec      {'spec', 'issues'}              the game spec after position checks
+  result    {'game_html', 'summary'}        the finished game
+  error     {'message', 'game_html'}        the run failed or was stopped
+"""
+
+QUEUED = "queued"
+ANALYSIS = "analysis"
+STATUS = "status"
+SPEC = "spec"
+RESULT = "result"
+ERROR = "error"
+
+
+def queued_event(position, wait):
+    return {'type': QUEUED, 'position': position, 'wait': wait}
+
+
+def analysis_event(analysis):
+    return {'type': ANALYSIS, 'analysis': analysis}
+
+
+def status_event(stage, message, placeholder=None):
+    return {'type': STATUS, 'stage': stage, 'message': message, 'placeholder': placeholder}
+
+
+def spec_event(spec, issues):
+    return {'type': SPEC, 'spec': spec, 'issues': issues}
+
+
+def result_event(game_html, summary):
+    return {'type': RESULT, 'game_html': game_html, 'summary': summary}
+
+
+def error_event(message, game_html):
+    return {'type': ERROR, 'message': message, 'game_html': game_html}
+
+
+def placeholder_html(text, color=None):
+    """Centered message shown in the game area while the game is built"""
+    style = "text-align: center; padding: 40px;" + (f" color: {color};" if color else "")
+    return f'<p style="{style}">{text}</p>'
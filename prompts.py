@@ -0,0 +1,426 @@
+"""
+Versioned prompt templates for every Claude call.
+
+Each prompt is a str.format template registered under (name, version). Names match
+the pipeline stages (plus the sections a stage prompt embeds); v1 is the wording the
+pipeline shipped with. Every call records the id of the prompt it used
+("js@v2") in the run's budget records and logs, and the component memo keys on it,
+so prompt variants can be compared (benchmarks/eval_prompts.py) without mixing
+their outputs.
+
+PROMPT_VERSIONS picks non-default versions, e.g. "js=v2,css=v2".
+Templates may ignore fields they don't need, so variants can drop sections.
+"""
+import os
+
+
+DEFAULT_VERSION = "v1"
+
+
+def parse_versions(value):
+    """'js=v2,css=v2' -> {'js': 'v2', 'css': 'v2'}"""
+    versions = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            name, version = part.split("=", 1)
+            versions[name.strip()] = version.strip()
+    return versions
+
+
+class PromptTemplate:
+    def __init__(self, name, version, text, note=""):
+        self.name = name
+        self.version = version
+        self.text = text
+        self.note = note
+
+    @property
+    def id(self):
+        return f"{self.name}@{self.version}"
+
+    def render(self, **fields):
+        return self.text.format(**fields)
+
+
+class PromptRegistry:
+    """Prompt templates by name and version; selected maps name -> version to use"""
+
+    def __init__(self, selected=None):
+        self._templates = {}
+        self.selected = dict(selected or {})
+
+    def register(self, name, version, text, note=""):
+        # Trailing spaces carry no meaning for the model, only tokens
+        text = "\n".join(line.rstrip() for line in text.split("\n"))
+        self._templates.setdefault(name, {})[version] = PromptTemplate(name, version, text, note)
+
+    def get(self, name, version=None):
+        """The template to use for name: version, else the selected one, else DEFAULT_VERSION"""
+        version = version or self.selected.get(name, DEFAULT_VERSION)
+        try:
+            return self._templates[name][version]
+        except KeyError:
+            raise ValueError(f"Unknown prompt {name}@{version} (have: {', '.join(self.versions(name))})") from None
+
+    def names(self):
+        return sorted(self._templates)
+
+    def versions(self, name):
+        return sorted(self._templates.get(name, {}))
+
+
+prompts = PromptRegistry(parse_versions(os.getenv("PROMPT_VERSIONS")))
+
+
+# --- Step 1: image analysis ---------------------------------------------------
+
+prompts.register("analysis", "v1", """Analyze this image for creating a 2D browser game.
+
+        Provide:
+
+        1. **SCENE TYPE**: What kind of scene is this? (living room, kitchen, office, outdoor, etc.)
+
+        2. **MAIN OBJECTS** (3-5 obstacles):
+        - Name, position (left/center/right, top/middle/bottom), size (small/medium/large)
+
+        3. **COLLECTIBLES** (3-5 small items):
+        - Name, position
+
+        4. **GOAL**: What would be a natural winning destination?
+
+        5. **GAME THEME**: What kind of game fits this scene?
+        - Kitchen → cooking/ingredient collection
+        - Beach → surfing/shell collecting
+        - Living room → treasure hunt
+        - Be creative!
+
+        6. **PLAYER START**: Best starting position
+
+        Be specific with positions and creative with theme!""")
+
+prompts.register("analysis", "v2", """Analyze this image for creating a 2D browser game. Answer in short plain lines, no markdown:
+SCENE TYPE: kind of scene
+MAIN OBJECTS: 3-5 obstacles as "name - position (left/center/right, top/middle/bottom) - size"
+COLLECTIBLES: 3-5 small items as "name - position"
+GOAL: a natural winning destination
+GAME THEME: a creative game that fits the scene (kitchen: cooking, beach: shell collecting...)
+PLAYER START: best starting position""", note="terse, no markdown")
+
+# --- Steps 1+2 in one call (PIPELINE_MODE=combined) ---------------------------
+
+prompts.register("design", "v1", """Analyze this image and design a 2D browser game from it.
+
+        ANALYSIS (the "analysis" field, plain text):
+        1. SCENE TYPE: What kind of scene is this?
+        2. MAIN OBJECTS (3-5 obstacles): name, position (left/center/right, top/middle/bottom), size
+        3. COLLECTIBLES (3-5 small items): name, position
+        4. GOAL: What would be a natural winning destination?
+        5. GAME THEME: What kind of game fits this scene? Be creative!
+        6. PLAYER START: Best starting position
+
+        SPEC (the "spec" field), built from your analysis:
+        - contracts must be exactly: canvas_id "gameCanvas", score_id "score", timer_id "timer", container_id "gameContainer"
+        - player: startX/startY in free space, size 25, speed 4
+        - obstacles: the main objects as rectangles in canvas pixels, realistic colors
+        - collectibles: size 15, gold-ish colors
+        - goal: rectangle with a bright color
+
+        COORDINATE SYSTEM:
+        - Canvas is 800x600 pixels, origin (0,0) is top-left
+        - Positions: left(50-200), center(300-500), right(600-750)
+        - Vertical: top(50-200), middle(250-400), bottom(450-550)
+
+        CRITICAL POSITIONING RULES:
+        1. Collectibles must NOT be placed inside obstacle rectangles
+        2. Collectibles should be at least 20 pixels away from obstacle edges
+        3. Collectibles must be reachable by the player
+        {layout}
+        Submit everything with the submit_game_design tool.""")
+
+# --- Sections embedded in the design / spec prompts ---------------------------
+
+prompts.register("large_world", "v1", """
+        LARGE WORLD: the level is {width}x{height} pixels and scrolls; the 800x600 canvas
+        shows part of it. All coordinates are world pixels. Spread obstacles and collectibles over the
+        whole world, about {obstacle_count} obstacles and {collectible_count} collectibles.
+        """)
+
+prompts.register("detected_layout", "v1", """
+        DETECTED LAYOUT (measured from the image, level pixels):
+        Obstacle candidates: {obstacles}
+        Free areas: {free}
+        - Use the obstacle candidates as obstacle rectangles (keep x/y/width/height), named after the matching objects
+        - Put the player start, the collectibles and the goal inside the free areas
+        """)
+
+# --- Step 2: game spec ----------------------------------------------------------
+
+prompts.register("spec", "v1", """Based on this image analysis, create a game specification in JSON format.
+      ANALYSIS:
+        {analysis}
+      {layout}
+
+      CRITICAL POSITIONING RULES:
+        1. Collectibles must NOT be placed inside obstacle rectangles
+        2. Collectibles should be at least 20 pixels away from obstacle edges
+        3. Collectibles must be reachable by the player
+        4. Check each collectible position against all obstacles before assigning
+
+      Generate a JSON spec with this exact structure:
+
+      {{
+        "title": "Creative game title",
+        "theme": "Brief theme description",
+        "contracts": {{
+            "canvas_id": "gameCanvas",
+            "score_id": "score",
+            "timer_id": "timer",
+            "container_id": "gameContainer"
+        }},
+        "player": {{
+            "startX": 50,
+            "startY": 500,
+            "size": 25,
+            "speed": 4
+        }},
+        "obstacles": [
+            {{"name": "Object name", "x": 200, "y": 300, "width": 150, "height": 100, "color": "#8B4513"}}
+        ],
+        "collectibles": [
+            {{"name": "Item name", "x": 400, "y": 200, "size": 15, "color": "#FFD700"}}
+        ],
+        "goal": {{
+            "name": "Goal description",
+            "x": 700,
+            "y": 50,
+            "width": 80,
+            "height": 60
+        }}
+     }}
+
+        COORDINATE SYSTEM:
+        - Canvas is 800x600 pixels
+        - Origin (0,0) is top-left
+        - Positions: left(50-200), center(300-500), right(600-750)
+        - Vertical: top(50-200), middle(250-400), bottom(450-550)
+
+        COLORS:
+        - Use realistic colors: brown for furniture, green for plants, gold for collectibles
+        - Make goal stand out with bright color
+
+        Return ONLY valid JSON, no explanations.""")
+
+prompts.register("spec", "v2", """Based on this image analysis, create a game specification as compact JSON (no indentation).
+ANALYSIS:
+{analysis}
+{layout}
+Structure: {{"title": str, "theme": str, "contracts": {{"canvas_id": "gameCanvas", "score_id": "score", "timer_id": "timer", "container_id": "gameContainer"}}, "player": {{"startX": n, "startY": n, "size": 25, "speed": 4}}, "obstacles": [{{"name": str, "x": n, "y": n, "width": n, "height": n, "color": "#hex"}}], "collectibles": [{{"name": str, "x": n, "y": n, "size": 15, "color": "#hex"}}], "goal": {{"name": str, "x": n, "y": n, "width": n, "height": n}}}}
+Canvas 800x600, origin top-left. Collectibles: outside every obstacle, 20px from their edges, reachable from the player start.
+Realistic obstacle colors, gold collectibles, a bright goal. Return ONLY the JSON.""", note="compact JSON, schema on one line")
+
+# --- Step 3: components ---------------------------------------------------------
+
+prompts.register("html", "v1", """Generate the HTML body structure for this game.
+
+        GAME SPEC:
+        Title: {title}
+        Theme: {theme}
+
+        REQUIRED ELEMENTS WITH THESE EXACT IDs:
+        - Container: id="{container_id}"
+        - Canvas: id="{canvas_id}" (must be 800x600)
+        - Score display: id="{score_id}"
+        - Timer display: id="{timer_id}"
+
+        REQUIREMENTS:
+        - Clean, semantic HTML
+        - Title should be: {title}
+        - Add brief instructions
+        - Show score as "Score: X/{collectible_count}"
+
+        Return ONLY the HTML body content (no <!DOCTYPE>, <html>, <head>, or <style>).
+        Start with <div id="{container_id}"> and end with </div>.""")
+
+prompts.register("html", "v2", """Generate the HTML body for the game "{title}" ({theme}).
+Elements with these exact ids: container div id="{container_id}", canvas id="{canvas_id}" width="800" height="600",
+score id="{score_id}" showing "Score: 0/{collectible_count}", timer id="{timer_id}". Add an h1 title and one line of instructions.
+Return ONLY the body markup, starting with <div id="{container_id}"> and ending with </div>.""", note="one paragraph")
+
+prompts.register("css", "v1", """Generate CSS for this game.
+
+        GAME TITLE: {title}
+
+        HTML IDs TO STYLE:
+        - #{container_id}
+        - #{canvas_id}
+        - #{score_id}
+        - #{timer_id}
+
+        REQUIREMENTS:
+        - Dark theme: background #1a1a1a
+        - Green accents: #00ff88
+        - Canvas: 3px solid #00ff88 border, rounded corners
+        - Centered layout
+        - Good typography
+        - Responsive spacing
+
+        Return ONLY the CSS (no <style> tags, just the CSS rules).""")
+
+prompts.register("css", "v2", """Generate compact CSS (at most 15 rules, no comments) for the game "{title}".
+Style #{container_id}, #{canvas_id}, #{score_id} and #{timer_id}: dark background #1a1a1a, #00ff88 accents,
+canvas with a 3px solid #00ff88 border and rounded corners, centered layout.
+Return ONLY the CSS rules.""", note="capped rule count")
+
+prompts.register("js_world", "v1", """
+        LARGE WORLD ({width}x{height} px; the 800x600 canvas is a scrolling view):
+        window.GameWorld is already defined by the page - do not redefine it.
+        - Read the level from GameWorld.obstacles, GameWorld.collectibles, GameWorld.goal and GameWorld.player
+        - Collisions: only test the obstacles returned by GameWorld.nearby(x, y, width, height), never loop over all of them
+        - Keep the player inside the world (0..{width}, 0..{height}), not the canvas
+        - Every frame call GameWorld.follow(player), then draw the level between GameWorld.begin(ctx) and GameWorld.end(ctx)
+        - Inside that camera transform call GameWorld.drawStatic(ctx, bgImage) for the background and obstacles
+        - Only draw GameWorld.visible(remaining collectibles)
+        - Draw messages after GameWorld.end(ctx) so they stay in screen space
+        """)
+
+prompts.register("js", "v1", """Generate JavaScript game logic for this browser game.
+
+        GAME SPEC:
+        {spec}
+        {world_rules}
+
+        REQUIRED DOM ELEMENTS (from HTML):
+        - Canvas: document.getElementById('{canvas_id}')
+        - Score: document.getElementById('{score_id}')
+        - Timer: document.getElementById('{timer_id}')
+
+        REQUIREMENTS:
+        1. Get canvas context: const ctx = canvas.getContext('2d')
+        2. Load background image: - USE THIS EXACT PLACEHOLDER:
+           const bgImage = new Image();
+           bgImage.onload = () => {{ console.log('Image loaded'); startGame(); }};
+           bgImage.onerror = () => {{ console.warn('Image failed'); startGame(); }};
+           bgImage.src = 'PLACEHOLDER_IMAGE_DATA';
+        3. Arrow key controls (←↑↓→)
+        4. Player moves at speed from spec
+        5. Collision detection with obstacles from spec
+        6. Collect items from spec
+        7. Win when all items collected + reach goal
+        8. Update score and timer displays
+        9. Game loop with requestAnimationFrame
+        10. Required functions: startGame(), gameLoop(), draw()
+        11. Game should finish in 2 minute
+        12. When an item is collected, the item collected name should briefly appear at the top of the canvas for 3 seconds.
+        13. The background and the obstacles (translucent fills in their spec colors, dark border, name in a small font)
+            are pre-rendered once by the page: draw both with the single call GameWorld.drawStatic(ctx, bgImage).
+            Do NOT draw the background image or the obstacles yourself. window.GameWorld is already defined.
+        14. CRITICAL - START GAME IMMEDIATELY:
+            At the very end of the script, call startGame() immediately:
+
+            // Start game when DOM is ready
+            if (document.readyState === 'loading') {{
+                document.addEventListener('DOMContentLoaded', startGame);
+            }} else {{
+                startGame();
+            }}
+        15. CRITICAL: Use EXACTLY the text 'PLACEHOLDER_IMAGE_DATA' for the image src.
+            Do NOT generate any base64 data yourself.
+        16. CRITICAL DRAWING ORDER in draw() function:
+                a) Clear canvas
+                b) GameWorld.drawStatic(ctx, bgImage) - background and obstacles
+                c) Draw collectibles
+                d) Draw goal
+                e) Draw player LAST (so it's always on top!)
+
+            Make player VERY VISIBLE:
+            - Player color: bright pink/red (#FF1493 or #FF69B4)
+            - Player size: 25x25 pixels
+            - Draw player as filled rectangle or circle
+            - Add black border around player (lineWidth: 2)
+            Return ONLY JavaScript code (no <script> tags).
+            Use the exact obstacle and collectible positions from the spec.""")
+
+prompts.register("js", "v2", """Write the JavaScript for this browser game. Compact code: no comments, no console logging.
+SPEC: {spec_compact}
+{world_rules}
+- Elements: document.getElementById('{canvas_id}') (2d context), '{score_id}' ("Score: X/N"), '{timer_id}' (seconds left, 120 to start)
+- const bgImage = new Image(); bgImage.src = 'PLACEHOLDER_IMAGE_DATA'; (exactly this text, never base64)
+- window.GameWorld already exists: GameWorld.drawStatic(ctx, bgImage) draws the background and obstacles, never draw them yourself
+- Arrow keys move the player (spec size and speed); obstacles from the spec block movement
+- Touching a collectible collects it and shows its name at the top of the canvas for 3s; win when all are collected and the goal is reached
+- Functions startGame(), gameLoop() (requestAnimationFrame) and draw(): clear, drawStatic, collectibles, goal, then the player last
+  as a #FF1493 25x25 square with a 2px black border
+- Call startGame() at the end of the script
+Return ONLY the JavaScript.""", note="terse requirements, no comments or logging in the output")
+
+# --- Repairs --------------------------------------------------------------------
+
+prompts.register("repair_positions", "v1", """Fix the collectible positions in this game spec.
+
+    CURRENT SPEC:
+    {spec}
+
+    PROBLEMS FOUND:
+    {issues}
+
+    TASK:
+    Generate NEW positions for these collectibles: {names}
+
+    RULES:
+    - Keep same collectibles (names, sizes, colors)
+    - Change ONLY their x,y positions
+    - Must NOT overlap any obstacle rectangles
+    - Must be at least 20 pixels from obstacle edges
+    - Must be reachable by player
+
+    Return ONLY a JSON array of the fixed collectibles with this structure:
+    [
+    {{"name": "Item", "x": 123, "y": 456, "size": 15, "color": "#FFD700", "collected": false}}
+    ]
+
+    Return ONLY the JSON array, no explanations.""")
+
+prompts.register("repair_html", "v1", """Fix this HTML component.
+
+        ISSUES:
+        {issues}
+
+        ORIGINAL HTML:
+        {html}
+
+        REQUIRED IDs:
+        - {container_id}
+        - {canvas_id} (800x600)
+        - {score_id}
+        - {timer_id}
+
+        Fix the issues. Return ONLY the corrected HTML (no explanations).""")
+
+prompts.register("repair_css", "v1", """Fix this CSS component.
+
+        ISSUES:
+        {issues}
+
+        ORIGINAL CSS:
+        {css}
+
+        REQUIRED SELECTORS:
+        - #{canvas_id}
+        - #{container_id}
+
+        Fix the issues. Return ONLY the corrected CSS (no explanations).""")
+
+prompts.register("repair_js", "v1", """Fix this JavaScript component.
+
+        ISSUES:
+        {issues}
+
+        ORIGINAL JS:
+        {js}...
+
+        REQUIRED:
+        - Functions: startGame(), gameLoop(), draw()
+        - Use IDs: {canvas_id}, {score_id}, {timer_id}
+        - requestAnimationFrame in game loop
+
+        Fix the issues. Return ONLY the corrected JavaScript (no explanations).""")
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+
+
+# Whole run, from Generate click to finished game
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "300"))
+
+# Upper bound for a single Claude call per stage, in seconds.
+# Override with e.g. STAGE_TIMEOUTS="js=90,analysis=45"
+DEFAULT_STAGE_TIMEOUTS = {
+    "analysis": 60,
+    "design": 90,
+    "spec": 60,
+    "html": 45,
+    "css": 45,
+    "js": 120,
+    "repair_positions": 45,
+    "repair_html": 45,
+    "repair_css": 45,
+    "repair_js": 120,
+}
+
+
+def parse_stage_timeouts(value):
+    """'js=90,analysis=45' -> {'js': 90.0, 'analysis': 45.0}"""
+    timeouts = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            stage, seconds = part.split("=", 1)
+            timeouts[stage.strip()] = float(seconds)
+    return timeouts
+
+
+STAGE_TIMEOUTS = dict(DEFAULT_STAGE_TIMEOUTS, **parse_stage_timeouts(os.getenv("STAGE_TIMEOUTS")))
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    """Raised once a run has been cancelled or has passed its deadline"""
+
+
+class RunContext:
+    """
+    Per-run cancel flag and deadline, shared by everything working on one generation.
+
+    cancel() can be called from any thread (Stop button, tab closed, image replaced);
+    registered callbacks run immediately so in-flight Claude calls are aborted.
+    A timer cancels the run when the deadline passes.
+    """
+
+    def __init__(self, deadline=RUN_DEADLINE, stage_timeouts=None):
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline
+        self.stage_timeouts = stage_timeouts or STAGE_TIMEOUTS
+        self.reason = None
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._detach = None
+
+        self._timer = threading.Timer(deadline, self.cancel, args=("deadline exceeded",))
+        self._timer.daemon = True
+        self._timer.start()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def timed_out(self):
+        return self.reason == "deadline exceeded"
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the run and abort whatever is in flight (idempotent)"""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        logger.info("Run cancelled: %s", reason)
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Call callback() when the run is cancelled (right away if it already is)"""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        """Forget a callback registered with on_cancel (e.g. the call it aborts has finished)"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def child(self):
+        """
+        Context for one branch of this run (e.g. a hedged candidate): cancelled
+        with its parent, but can also be cancelled on its own.
+        """
+        child = RunContext(deadline=max(0.0, self.remaining()), stage_timeouts=self.stage_timeouts)
+        propagate = lambda: child.cancel(self.reason)
+        self.on_cancel(propagate)
+        child._detach = lambda: self.remove_callback(propagate)
+        return child
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def check(self, stage):
+        """Raise GenerationCancelled if the run shouldn't continue into this stage"""
+        if not self.cancelled and self.remaining() <= 0:
+            self.cancel("deadline exceeded")
+        if self.cancelled:
+            raise GenerationCancelled(f"{stage} skipped: {self.reason}")
+
+    def timeout_for(self, stage):
+        """Timeout for one call: the stage's limit, capped by what's left of the run"""
+        return max(1.0, min(self.stage_timeouts.get(stage, 60), self.remaining()))
+
+    def close(self):
+        """Run finished - stop the deadline timer"""
+        self._timer.cancel()
+        if self._detach is not None:
+            self._detach()
+
+
+class RunRegistry:
+    """Active runs per Gradio session, so Stop / tab close can cancel them"""
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def register(self, session, context):
+        with self._lock:
+            self._runs.setdefault(session, set()).add(context)
+
+    def unregister(self, session, context):
+        with self._lock:
+            runs = self._runs.get(session)
+            if runs is not None:
+                runs.discard(context)
+                if not runs:
+                    del self._runs[session]
+
+    def cancel_session(self, session, reason):
+        with self._lock:
+            runs = list(self._runs.pop(session, ()))
+        for context in runs:
+            context.cancel(reason)
+        return len(runs)
@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+
+CANVAS_SIZE = (800, 600)
+# Analysis grid: 80x60 cells of 10x10 canvas pixels
+CELL = 10
+# Larger levels (scrolling worlds) get bigger square cells so the grid stays about
+# this size: the rectangle search is a Python loop over every cell
+MAX_GRID_CELLS = 80 * 60
+# Per 800x600 screen of level
+MAX_OBSTACLES = 6
+MAX_FREE_AREAS = 4
+# Obstacle candidates smaller than this share of a screen are noise
+MIN_OBSTACLE_AREA = 0.01
+# Free areas keep this many CELL-sized cells away from obstacles (collectibles need 20px)
+FREE_MARGIN = 2
+MIN_FREE_SIZE = 6
+
+
+def _box_blur(values, radius):
+    """Mean over a (2r+1)^2 window via an integral image"""
+    padded = np.pad(values, radius + 1, mode="edge")
+    integral = padded.cumsum(0).cumsum(1)
+    size = 2 * radius + 1
+    window = (integral[size:, size:] - integral[:-size, size:]
+              - integral[size:, :-size] + integral[:-size, :-size])
+    return window[:values.shape[0], :values.shape[1]] / (size * size)
+
+
+def _otsu(values):
+    """Threshold that best splits values into two classes, None if they can't be split"""
+    hist, edges = np.histogram(values, bins=64)
+    weights = hist.cumsum()
+    means = (hist * edges[:-1]).cumsum()
+    total, total_mean = weights[-1], means[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mean * weights - means * total) ** 2 / (weights * (total - weights))
+    between = between[:-1]
+    # All NaN when every value falls in one bin (a flat or solid-colour image)
+    if not np.isfinite(between).any():
+        return None
+    return edges[np.nanargmax(between)]
+
+
+def _shift_reduce(mask, op):
+    """3x3 dilation (np.logical_or) or erosion (np.logical_and)"""
+    padded = np.pad(mask, 1, mode="edge")
+    h, w = mask.shape
+    result = padded[1:h + 1, 1:w + 1].copy()
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            result = op(result, padded[dy:dy + h, dx:dx + w])
+    return result
+
+
+def _components(mask):
+    """Bounding boxes (r0, c0, r1, c1, cells) of 4-connected True regions"""
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    boxes = []
+    h, w = mask.shape
+    for start in zip(*np.nonzero(mask)):
+        if labels[start]:
+            continue
+        label = len(boxes) + 1
+        labels[start] = label
+        stack = [start]
+        r0, c0, r1, c1, cells = start[0], start[1], start[0], start[1], 0
+        while stack:
+            r, c = stack.pop()
+            cells += 1
+            r0, c0, r1, c1 = min(r0, r), min(c0, c), max(r1, r), max(c1, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < h and 0 <= nc < w and mask[nr, nc] and not labels[nr, nc]:
+                    labels[nr, nc] = label
+                    stack.append((nr, nc))
+        boxes.append((r0, c0, r1 + 1, c1 + 1, cells))
+    return boxes
+
+
+def _largest_rectangle(mask):
+    """Largest all-True axis-aligned rectangle (r0, c0, r1, c1), via row histograms"""
+    heights = np.zeros(mask.shape[1], dtype=np.int32)
+    best, best_area = None, 0
+    for row in range(mask.shape[0]):
+        heights = np.where(mask[row], heights + 1, 0)
+        # Plain ints: indexing and comparing numpy scalars is ~5x slower in this loop
+        row_heights = heights.tolist() + [0]
+        stack = []
+        for col, height in enumerate(row_heights):
+            start = col
+            while stack and stack[-1][1] >= height:
+                start, top = stack.pop()
+                area = top * (col - start)
+                if area > best_area:
+                    best_area, best = area, (row - top + 1, start, row + 1, col)
+            stack.append((start, height))
+    return best
+
+
+def _to_canvas(box, name, color=None, cell=CELL):
+    r0, c0, r1, c1 = box[:4]
+    rect = {"name": name, "x": int(c0) * cell, "y": int(r0) * cell,
+            "width": int(c1 - c0) * cell, "height": int(r1 - r0) * cell}
+    if color is not None:
+        rect["color"] = color
+    return rect
+
+
+def propose_layout(img, size=CANVAS_SIZE):
+    """
+    Candidate obstacle and free-space rectangles in level coordinates (the 800x600
+    canvas, or a wider scrolling world the image is stretched over).
+
+    Salient regions (colour that stands out from the dominant background colour,
+    plus edge density) become obstacle candidates; the largest rectangles clear of them
+    (with a margin) are the free areas for the player, collectibles and goal.
+    A flat image (nothing stands out) has no obstacles or free areas.
+    """
+    cell = max(CELL, math.ceil(math.sqrt(size[0] * size[1] / MAX_GRID_CELLS)))
+    grid_w, grid_h = size[0] // cell, size[1] // cell
+    margin, min_free = math.ceil(FREE_MARGIN * CELL / cell), math.ceil(MIN_FREE_SIZE * CELL / cell)
+    screens = max(1, round(size[0] * size[1] / (CANVAS_SIZE[0] * CANVAS_SIZE[1])))
+    # 2x2 pixels per cell, the image stretched to the level like drawImage does
+    small = np.asarray(img.convert("RGB").resize((grid_w * 2, grid_h * 2), Image.Resampling.BILINEAR),
+                       dtype=np.float32)
+
+    # Distance from the dominant (median) colour - the floor/wall/sky the objects stand on
+    background = np.median(small.reshape(-1, 3), axis=0)
+    contrast = np.sqrt(((small - background) ** 2).sum(-1))
+    gray = small.mean(-1)
+    edges = np.abs(np.diff(gray, axis=0, append=gray[-1:])) + np.abs(np.diff(gray, axis=1, append=gray[:, -1:]))
+    edges = _box_blur(edges, 1)
+
+    score = contrast / (contrast.max() + 1e-6) + edges / (edges.max() + 1e-6)
+    score = score.reshape(grid_h, 2, grid_w, 2).mean(axis=(1, 3))
+    colors = small.reshape(grid_h, 2, grid_w, 2, 3).mean(axis=(1, 3))
+
+    threshold = _otsu(score) if score.max() - score.min() > 1e-6 else None
+    if threshold is None:
+        return {"obstacles": [], "free": []}
+    mask = score > threshold
+    # Closing then opening: join fragments of one object, drop speckles
+    mask = _shift_reduce(_shift_reduce(mask, np.logical_or), np.logical_and)
+    mask = _shift_reduce(_shift_reduce(mask, np.logical_and), np.logical_or)
+
+    screen_cells = grid_w * grid_h / screens
+    min_cells = MIN_OBSTACLE_AREA * screen_cells
+    boxes = sorted((b for b in _components(mask) if b[4] >= min_cells), key=lambda b: -b[4])
+    # A "region" covering most of a screen is background, not an object
+    boxes = [b for b in boxes if (b[2] - b[0]) * (b[3] - b[1]) < 0.5 * screen_cells][:MAX_OBSTACLES * screens]
+
+    obstacles = []
+    free = np.ones((grid_h, grid_w), dtype=bool)
+    for i, (r0, c0, r1, c1, _) in enumerate(boxes):
+        r, g, b = colors[r0:r1, c0:c1][mask[r0:r1, c0:c1]].mean(axis=0)
+        obstacles.append(_to_canvas((r0, c0, r1, c1), f"region {i + 1}", f"#{int(r):02x}{int(g):02x}{int(b):02x}", cell))
+        free[max(0, r0 - margin):r1 + margin, max(0, c0 - margin):c1 + margin] = False
+
+    free_areas = []
+    for i in range(MAX_FREE_AREAS * screens):
+        box = _largest_rectangle(free)
+        if box is None or min(box[2] - box[0], box[3] - box[1]) < min_free:
+            break
+        free_areas.append(_to_canvas(box, f"free {i + 1}", cell=cell))
+        free[box[0]:box[2], box[1]:box[3]] = False
+
+    return {"obstacles": obstacles, "free": free_areas}
@@ -0,0 +1,85 @@
+import collections
+
+import numpy as np
+
+
+SCREEN = {"width": 800, "height": 600}
+
+
+def world_of(spec):
+    """World size of a spec; single-screen specs have none and are 800x600"""
+    return spec.get('world') or SCREEN
+
+
+class SpatialGrid:
+    """
+    Uniform grid over axis-aligned rectangles ({'x','y','width','height'}).
+    Each rectangle is stored in every cell it touches, so a query only looks at
+    the few rectangles near a point instead of all of them.
+    """
+
+    def __init__(self, cell=100):
+        self.cell = cell
+        self._cells = collections.defaultdict(list)
+
+    def _span(self, x, y, w, h):
+        c = self.cell
+        return (range(int(x // c), int((x + w) // c) + 1),
+                range(int(y // c), int((y + h) // c) + 1))
+
+    def insert(self, rect):
+        cols, rows = self._span(rect['x'], rect['y'], rect['width'], rect['height'])
+        for cx in cols:
+            for cy in rows:
+                self._cells[cx, cy].append(rect)
+
+    def query(self, x, y, w=0, h=0):
+        """Rectangles stored in the cells overlapping (x, y, w, h), each once"""
+        cols, rows = self._span(x, y, w, h)
+        seen, found = set(), []
+        for cx in cols:
+            for cy in rows:
+                for rect in self._cells.get((cx, cy), ()):
+                    if id(rect) not in seen:
+                        seen.add(id(rect))
+                        found.append(rect)
+        return found
+
+
+def reachable_map(world, obstacles, start, player_size, cell=10):
+    """
+    Boolean grid (cell-sized squares) of where the player's centre can get to from
+    start, with obstacles grown by half the player size. None if start is blocked.
+    """
+    cols, rows = -(-world['width'] // cell), -(-world['height'] // cell)
+    blocked = np.zeros((rows, cols), dtype=bool)
+    pad = player_size / 2
+    for o in obstacles:
+        r0 = max(0, int((o['y'] - pad) // cell))
+        c0 = max(0, int((o['x'] - pad) // cell))
+        r1 = int((o['y'] + o['height'] + pad) // cell) + 1
+        c1 = int((o['x'] + o['width'] + pad) // cell) + 1
+        blocked[r0:r1, c0:c1] = True
+
+    sr = min(rows - 1, max(0, int(start[1] // cell)))
+    sc = min(cols - 1, max(0, int(start[0] // cell)))
+    if blocked[sr, sc]:
+        return None
+
+    reached = np.zeros_like(blocked)
+    reached[sr, sc] = True
+    queue = collections.deque([(sr, sc)])
+    while queue:
+        r, c = queue.popleft()
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < rows and 0 <= nc < cols and not blocked[nr, nc] and not reached[nr, nc]:
+                reached[nr, nc] = True
+                queue.append((nr, nc))
+    return reached
+
+
+def can_reach(reached, x, y, radius, cell=10):
+    """Whether the player's centre gets within radius of (x, y)"""
+    r0, r1 = max(0, int((y - radius) // cell)), int((y + radius) // cell) + 1
+    c0, c1 = max(0, int((x - radius) // cell)), int((x + radius) // cell) + 1
+    return bool(reached[r0:r1, c0:c1].any())
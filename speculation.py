@@ -0,0 +1,139 @@
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from budget import key_fingerprint
+from log_setup import run_id, new_run_id
+
+
+SPECULATIVE_ANALYSIS = os.getenv("SPECULATIVE_ANALYSIS", "1") == "1"
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "4"))
+# Finished results nobody picked up are dropped after this long
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+def image_fingerprint(image_path):
+    """Hash of the uploaded file's bytes"""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class _Job:
+    def __init__(self, future):
+        self.future = future
+        self.generator = None
+        self.cancelled = threading.Event()
+        self.created = time.time()
+        # Log lines of the speculative analysis carry this id
+        self.run_id = new_run_id()
+
+    def cancel(self):
+        """Stop the job, aborting its Claude call if one is in flight"""
+        self.cancelled.set()
+        self.future.cancel()
+        generator = self.generator
+        if generator is not None:
+            generator.cancel("image replaced")
+
+    def result(self):
+        """
+        Prepared analysis, waiting for it if still in flight.
+        Returns None if the speculative run was cancelled or failed.
+        """
+        try:
+            prepared = self.future.result()
+        except Exception as e:
+            logger.warning("Speculative analysis unusable (%s), running normally", e)
+            return None
+        if prepared is None or "Error" in prepared['analysis']:
+            return None
+        return prepared
+
+
+class SpeculativeAnalyzer:
+    """
+    Starts image encoding + analysis as soon as an image is uploaded, so the
+    ~15s analysis overlaps with the user's think-time before clicking Generate.
+
+    Jobs are keyed by (image hash, API key fingerprint). Generate claims the
+    finished or in-flight job; uploading a different image cancels the old one,
+    aborting its in-flight call so the tokens aren't spent.
+    """
+
+    def __init__(self, make_generator, workers=SPECULATION_WORKERS):
+        self.make_generator = make_generator
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def job_key(self, image_path, api_key):
+        return f"{image_fingerprint(image_path)}:{key_fingerprint(api_key)}"
+
+    def start(self, image_path, api_key):
+        """Start analysing this upload in the background, returns the job key"""
+        key = self.job_key(image_path, api_key)
+        with self.lock:
+            self._expire()
+            if key not in self.jobs:
+                job = _Job(None)
+                # Own context, so the job's run id doesn't stick to the pool thread
+                job.future = self.executor.submit(contextvars.copy_context().run, self._run, job, image_path, api_key)
+                self.jobs[key] = job
+                logger.info("Speculative analysis started: %s", key[:12], extra={"speculation_run_id": job.run_id})
+        return key
+
+    def cancel(self, key):
+        """Drop a job whose image was replaced or removed"""
+        with self.lock:
+            job = self.jobs.pop(key, None)
+        if job is not None:
+            job.cancel()
+            logger.info("Speculative analysis cancelled: %s", key[:12])
+
+    def claim(self, image_path, api_key):
+        """
+        Hand the job for this image/key over to a run, without waiting for it.
+        The run calls job.result() once it has shown progress. None if nothing was started.
+        """
+        key = self.job_key(image_path, api_key)
+        with self.lock:
+            job = self.jobs.pop(key, None)
+        if job is not None:
+            logger.info("Reusing speculative analysis: %s", key[:12], extra={"speculation_run_id": job.run_id})
+        return job
+
+    def _run(self, job, image_path, api_key):
+        run_id.set(job.run_id)
+        if job.cancelled.is_set():
+            return None
+        generator = self.make_generator(api_key)
+        job.generator = generator
+        # cancel() may have run before the generator existed
+        if job.cancelled.is_set():
+            return None
+        images = generator.encode_image(image_path)
+        if job.cancelled.is_set():
+            return None
+
+        analysis, spec = generator.analyze_scene(image_path, images)
+        return {
+            'images': images,
+            'analysis': analysis,
+            'spec': spec,
+            # Usage is charged to the run that picks this up
+            'calls': generator.budget.calls
+        }
+
+    def _expire(self):
+        cutoff = time.time() - SPECULATION_TTL
+        for key in [k for k, job in self.jobs.items() if job.future.done() and job.created < cutoff]:
+            del self.jobs[key]
@@ -0,0 +1,191 @@
+import math
+
+from spatial_grid import SCREEN
+
+
+# Fixed components for the degraded mode: a collect-and-escape game built from the
+# layout measured locally from the image, so it costs no Claude calls at all.
+TEMPLATE_CONTRACTS = {
+    "canvas_id": "gameCanvas",
+    "score_id": "score",
+    "timer_id": "timer",
+    "container_id": "gameContainer"
+}
+
+TEMPLATE_HTML = """<div id="gameContainer">
+    <h1>Photo Dash</h1>
+    <p class="hint">Quick game while things are busy - collect every gem, then reach the exit!</p>
+    <div class="hud"><span id="score">Gems: 0</span> <span id="timer">Time: 90</span></div>
+    <canvas id="gameCanvas" width="800" height="600"></canvas>
+</div>"""
+
+TEMPLATE_CSS = """body { margin: 0; background: #111; color: #eee; font-family: sans-serif; }
+#gameContainer { text-align: center; }
+#gameContainer h1 { margin: 8px 0 4px; color: #00ff88; }
+.hint { margin: 0 0 8px; color: #aaa; font-size: 14px; }
+.hud { display: flex; justify-content: center; gap: 24px; margin-bottom: 8px; font-size: 18px; }
+#gameCanvas { border: 3px solid #00ff88; border-radius: 6px; background: #222; }
+"""
+
+TEMPLATE_JS = """const canvas = document.getElementById('gameCanvas');
+const ctx = canvas.getContext('2d');
+const scoreEl = document.getElementById('score');
+const timerEl = document.getElementById('timer');
+const bgImage = new Image();
+bgImage.src = 'PLACEHOLDER_IMAGE_DATA';
+
+const start = GameWorld.player;
+const player = { x: start.startX, y: start.startY, size: start.size, speed: start.speed };
+const gems = GameWorld.collectibles.map((c) => Object.assign({ taken: false }, c));
+const keys = {};
+let collected = 0, timeLeft = 90, state = 'playing', lastSecond = null;
+
+window.addEventListener('keydown', (e) => { keys[e.key] = true; });
+window.addEventListener('keyup', (e) => { keys[e.key] = false; });
+
+function blocked(x, y) {
+    const s = player.size;
+    if (x < 0 || y < 0 || x + s > GameWorld.world.width || y + s > GameWorld.world.height) return true;
+    return GameWorld.nearby(x, y, s, s).some((o) =>
+        x < o.x + o.width && x + s > o.x && y < o.y + o.height && y + s > o.y);
+}
+
+function update(ts) {
+    if (state !== 'playing') return;
+    if (lastSecond === null) lastSecond = ts;
+    if (ts - lastSecond >= 1000) {
+        lastSecond = ts;
+        timeLeft -= 1;
+        if (timeLeft <= 0) state = 'lost';
+    }
+    const dx = (keys.ArrowRight ? 1 : 0) - (keys.ArrowLeft ? 1 : 0);
+    const dy = (keys.ArrowDown ? 1 : 0) - (keys.ArrowUp ? 1 : 0);
+    if (dx && !blocked(player.x + dx * player.speed, player.y)) player.x += dx * player.speed;
+    if (dy && !blocked(player.x, player.y + dy * player.speed)) player.y += dy * player.speed;
+
+    const cx = player.x + player.size / 2, cy = player.y + player.size / 2;
+    gems.forEach((g) => {
+        if (!g.taken && Math.hypot(g.x - cx, g.y - cy) < (g.size + player.size) / 2) {
+            g.taken = true;
+            collected += 1;
+        }
+    });
+    const goal = GameWorld.goal;
+    if (collected === gems.length && cx > goal.x && cx < goal.x + goal.width &&
+        cy > goal.y && cy < goal.y + goal.height) state = 'won';
+    scoreEl.textContent = 'Gems: ' + collected + '/' + gems.length;
+    timerEl.textContent = 'Time: ' + timeLeft;
+}
+
+function draw() {
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    GameWorld.follow(player);
+    GameWorld.begin(ctx);
+    GameWorld.drawStatic(ctx, bgImage);
+
+    const goal = GameWorld.goal;
+    ctx.globalAlpha = collected === gems.length ? 0.9 : 0.4;
+    ctx.fillStyle = '#00ff88';
+    ctx.fillRect(goal.x, goal.y, goal.width, goal.height);
+    ctx.globalAlpha = 1;
+    ctx.fillStyle = '#000';
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'middle';
+    ctx.font = 'bold 14px sans-serif';
+    ctx.fillText('EXIT', goal.x + goal.width / 2, goal.y + goal.height / 2);
+
+    GameWorld.visible(gems.filter((g) => !g.taken)).forEach((g) => {
+        ctx.beginPath();
+        ctx.arc(g.x, g.y, g.size / 2, 0, Math.PI * 2);
+        ctx.fillStyle = g.color;
+        ctx.fill();
+        ctx.strokeStyle = '#fff';
+        ctx.stroke();
+    });
+
+    ctx.fillStyle = '#ff4081';
+    ctx.fillRect(player.x, player.y, player.size, player.size);
+    ctx.strokeStyle = '#fff';
+    ctx.strokeRect(player.x, player.y, player.size, player.size);
+    GameWorld.end(ctx);
+
+    if (state !== 'playing') {
+        ctx.fillStyle = 'rgba(0, 0, 0, 0.6)';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        ctx.fillStyle = '#fff';
+        ctx.font = 'bold 40px sans-serif';
+        ctx.fillText(state === 'won' ? 'You escaped!' : 'Out of time!', canvas.width / 2, canvas.height / 2);
+    }
+}
+
+function gameLoop(ts) {
+    update(ts);
+    draw();
+    requestAnimationFrame(gameLoop);
+}
+
+function startGame() {
+    scoreEl.textContent = 'Gems: 0/' + gems.length;
+    requestAnimationFrame(gameLoop);
+}
+
+startGame();
+"""
+
+GEM_COLORS = ["#FFD700", "#00E5FF", "#FF6E40", "#B388FF", "#76FF03"]
+PLAYER_SIZE = 25
+GEM_SIZE = 18
+GOAL_SIZE = 60
+
+
+def _center(rect):
+    return rect['x'] + rect['width'] / 2, rect['y'] + rect['height'] / 2
+
+
+def template_spec(layout=None, world=None):
+    """
+    Spec for the template game from the measured layout (scene_layout.propose_layout):
+    obstacle candidates as obstacles, the player in the largest free area, the exit in
+    the free area farthest from it and a gem in each of the others.
+    """
+    world = world or SCREEN
+    layout = layout or {}
+    obstacles = [dict(o) for o in layout.get('obstacles', [])]
+    free = sorted(layout.get('free') or [], key=lambda r: -r['width'] * r['height'])
+    if not free:
+        free = [{"name": "free 1", "x": 0, "y": 0, "width": world['width'], "height": world['height']}]
+
+    px, py = _center(free[0])
+    player = {"startX": int(px - PLAYER_SIZE / 2), "startY": int(py - PLAYER_SIZE / 2),
+              "size": PLAYER_SIZE, "speed": 4}
+
+    rest = free[1:] or free
+    exit_area = max(rest, key=lambda r: math.dist(_center(r), (px, py)))
+    gx, gy = _center(exit_area)
+    goal = {"name": "Exit", "x": int(gx - GOAL_SIZE / 2), "y": int(gy - GOAL_SIZE / 2),
+            "width": GOAL_SIZE, "height": GOAL_SIZE, "color": "#00ff88"}
+
+    # One gem per remaining free area; small layouts also get gems in the corners of the first one
+    spots = [_center(r) for r in free[1:] if r is not exit_area]
+    if len(spots) < 3:
+        area = free[0]
+        inset = PLAYER_SIZE * 2
+        spots += [(area['x'] + inset, area['y'] + inset),
+                  (area['x'] + area['width'] - inset, area['y'] + area['height'] - inset),
+                  (area['x'] + area['width'] - inset, area['y'] + inset)]
+    collectibles = [{"name": f"Gem {i + 1}", "x": int(x), "y": int(y), "size": GEM_SIZE,
+                     "color": GEM_COLORS[i % len(GEM_COLORS)]}
+                    for i, (x, y) in enumerate(spots[:len(GEM_COLORS)])]
+
+    spec = {
+        "title": "Photo Dash",
+        "theme": "Quick collect-and-escape game over your photo",
+        "contracts": dict(TEMPLATE_CONTRACTS),
+        "player": player,
+        "obstacles": obstacles,
+        "collectibles": collectibles,
+        "goal": goal
+    }
+    if world != SCREEN:
+        spec['world'] = world
+    return spec